@@ -0,0 +1,52 @@
+import os
+import threading
+import time
+from typing import Optional
+
+from cachetools import TTLCache
+
+# Neither this service nor the Node backend has a logout or token revocation path to hook
+# into, so nothing invalidates entries early: a deleted or changed user stays cached for
+# up to AUTH_CACHE_TTL seconds (never past the token's own exp). Lower it to tighten that.
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX_SIZE = int(os.getenv("AUTH_CACHE_MAX_SIZE", "10000"))
+
+
+class TokenCache:
+    """Bounded TTL cache of verified JWT -> user document.
+
+    Users are managed by the Node backend, so a deleted user's tokens keep working
+    here for up to AUTH_CACHE_TTL seconds.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, max_size: int = AUTH_CACHE_MAX_SIZE):
+        self._cache = TTLCache(maxsize=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._cache.get(token)
+        if entry is None:
+            return None
+        user, expires_at = entry
+        # Never outlive the token itself
+        if expires_at is not None and time.time() >= expires_at:
+            self.invalidate_token(token)
+            return None
+        return user
+
+    def put(self, token: str, user: dict, expires_at: Optional[float] = None):
+        with self._lock:
+            self._cache[token] = (user, expires_at)
+
+    def invalidate_token(self, token: str):
+        """Drops one token (used for tokens past their exp)"""
+        with self._lock:
+            self._cache.pop(token, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._cache), "max_size": self._cache.maxsize}
+
+
+token_cache = TokenCache()
@@ -0,0 +1,134 @@
+"""Parity and throughput check for the embedding backends.
+
+Embeds the same synthetic corpus with each backend and compares them with the
+torch (sentence-transformers) reference: cosine drift per text, agreement of the
+top-k neighbours for sample queries, and texts/s, all as JSON:
+
+    python -m bench.embedding_backends --texts 2000 --output embed_bench.json
+
+Exits non-zero when a backend fails to load (instead of silently measuring the
+torch fallback) or its worst-case cosine to the reference falls below
+--min-cosine, so it can gate a backend switch in CI.
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from bench.load_test import synthetic_document, _percentiles
+
+
+def make_corpus(count: int, seed: int = 0):
+    """Chunk-like texts of varied length (about 10-200 words)"""
+    rng = np.random.default_rng(seed)
+    words = synthetic_document(count * 40, seed).split()
+    texts, position = [], 0
+    for _ in range(count):
+        length = int(rng.integers(10, 200))
+        if position + length > len(words):
+            position = 0
+        texts.append(" ".join(words[position:position + length]))
+        position += length
+    return texts
+
+
+def measure(model, texts, batch_size, queries):
+    start = time.perf_counter()
+    vectors = []
+    for i in range(0, len(texts), batch_size):
+        vectors.extend(model.embed_documents(texts[i:i + batch_size]))
+    elapsed = time.perf_counter() - start
+
+    query_times = []
+    for query in queries:
+        start = time.perf_counter()
+        model.embed_query(query)
+        query_times.append(time.perf_counter() - start)
+    return np.asarray(vectors, dtype=np.float32), elapsed, query_times
+
+
+def topk_agreement(reference, candidate, query_count, k):
+    """Mean overlap of each sample text's top-k neighbours under both embeddings"""
+    overlaps = []
+    for i in range(min(query_count, len(reference))):
+        ref = set(np.argsort(-(reference @ reference[i]))[1:k + 1])
+        got = set(np.argsort(-(candidate @ candidate[i]))[1:k + 1])
+        overlaps.append(len(ref & got) / k)
+    return float(np.mean(overlaps)) if overlaps else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding backend parity and throughput")
+    parser.add_argument("--model", default=None, help="defaults to rag.embedder.DEFAULT_MODEL_NAME")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=50, help="single-text latency samples and top-k probes")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    from rag import embedder
+    model_name = args.model or embedder.DEFAULT_MODEL_NAME
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    if "torch" in backends:
+        backends.remove("torch")
+    backends.insert(0, "torch")
+
+    texts = make_corpus(args.texts)
+    queries = texts[:args.queries]
+    report = {"config": {key: value for key, value in vars(args).items() if key != "output"},
+              "model": model_name, "backends": {}}
+    reference = None
+    failed = False
+
+    for backend in backends:
+        start = time.perf_counter()
+        model = embedder.load_embedding_model(model_name, backend)
+        load_s = time.perf_counter() - start
+        if backend != "torch" and not (isinstance(model, embedder.OnnxEmbeddings)
+                                       and model.quantized == (backend == "onnx-int8")):
+            # load_embedding_model falls back to torch when ONNX can't load
+            report["backends"][backend] = {"implementation": type(model).__name__,
+                                           "error": f"{backend} did not load (see the log)"}
+            failed = True
+            continue
+        model.embed_documents(texts[:8])
+
+        vectors, elapsed, query_times = measure(model, texts, args.batch_size, queries)
+        result = {
+            "implementation": type(model).__name__,
+            "load_s": round(load_s, 3),
+            "texts_per_s": round(len(texts) / elapsed, 1),
+            "query_latency_ms": _percentiles(query_times),
+        }
+        if reference is None:
+            reference = vectors
+            baseline = result["texts_per_s"]
+        else:
+            cosines = np.sum(reference * vectors, axis=1)
+            result["speedup"] = round(result["texts_per_s"] / baseline, 2)
+            result["cosine_to_reference"] = {
+                "mean": round(float(cosines.mean()), 6),
+                "min": round(float(cosines.min()), 6),
+                "p01": round(float(np.percentile(cosines, 1)), 6),
+            }
+            result[f"top{args.k}_agreement"] = round(topk_agreement(reference, vectors, args.queries, args.k), 4)
+            result["parity_ok"] = bool(cosines.min() >= args.min_cosine)
+            failed = failed or not result["parity_ok"]
+        report["backends"][backend] = result
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
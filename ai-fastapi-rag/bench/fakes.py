@@ -0,0 +1,536 @@
+"""In-process stand-ins for Mongo (Motor), Redis and the embedding model.
+
+They implement just the subset of each API this app uses, so benchmarks can run
+the real FastAPI app without external services.
+"""
+import asyncio
+import copy
+import fnmatch
+import hashlib
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from bson import ObjectId
+
+_MISSING = object()
+
+
+# ---------------------------------------------------------------- Mongo
+
+def _get_path(doc: Dict, path: str):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _set_path(doc: Dict, path: str, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _match_value(value, cond) -> bool:
+    if isinstance(cond, dict) and cond and all(key.startswith("$") for key in cond):
+        for op, arg in cond.items():
+            values = value if isinstance(value, list) else [value]
+            if op == "$in":
+                ok = any(v in arg for v in values)
+            elif op == "$nin":
+                ok = not any(v in arg for v in values)
+            elif op == "$ne":
+                ok = value != arg
+            elif op == "$exists":
+                ok = (value is not _MISSING) == bool(arg)
+            elif op == "$lt":
+                ok = value is not _MISSING and value < arg
+            elif op == "$lte":
+                ok = value is not _MISSING and value <= arg
+            elif op == "$gt":
+                ok = value is not _MISSING and value > arg
+            elif op == "$gte":
+                ok = value is not _MISSING and value >= arg
+            else:
+                raise NotImplementedError(f"Query operator {op}")
+            if not ok:
+                return False
+        return True
+    if isinstance(value, list) and not isinstance(cond, list):
+        return cond in value
+    return value == cond
+
+
+def _prepare(query: Dict) -> Dict:
+    """Turns $in/$nin lists into sets once per query instead of scanning them per document"""
+    if not query:
+        return query
+    prepared = {}
+    for key, cond in query.items():
+        if key == "$or":
+            cond = [_prepare(sub) for sub in cond]
+        elif isinstance(cond, dict):
+            cond = dict(cond)
+            for op in ("$in", "$nin"):
+                if isinstance(cond.get(op), list):
+                    try:
+                        cond[op] = frozenset(cond[op])
+                    except TypeError:
+                        pass
+        prepared[key] = cond
+    return prepared
+
+
+def _matches(doc: Dict, query: Dict) -> bool:
+    for key, cond in (query or {}).items():
+        if key == "$or":
+            if not any(_matches(doc, sub) for sub in cond):
+                return False
+        elif not _match_value(_get_path(doc, key), cond):
+            return False
+    return True
+
+
+def _project(doc: Dict, projection) -> Dict:
+    if not projection:
+        return copy.deepcopy(doc)
+    include = {key for key, on in projection.items() if on}
+    if include - {"_id"}:
+        result = {}
+        if projection.get("_id", 1):
+            result["_id"] = doc["_id"]
+        for path in include:
+            value = _get_path(doc, path)
+            if value is not _MISSING:
+                _set_path(result, path, copy.deepcopy(value))
+        return result
+    result = copy.deepcopy(doc)
+    for path, on in projection.items():
+        if not on:
+            parts = path.split(".")
+            target = _get_path(result, ".".join(parts[:-1])) if len(parts) > 1 else result
+            if isinstance(target, dict):
+                target.pop(parts[-1], None)
+    return result
+
+
+class _Result:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class FakeCursor:
+    def __init__(self, docs: List[Dict], projection):
+        self._docs = docs
+        self._projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+        self._position = None
+
+    def sort(self, key, direction=1):
+        self._sort = key if isinstance(key, list) else [(key, direction)]
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def _materialize(self):
+        if self._position is None:
+            docs = self._docs
+            # Stable sorts applied from the last key to the first give a compound order
+            for key, direction in reversed(self._sort or []):
+                docs = sorted(docs, key=lambda d, key=key: _get_path(d, key), reverse=direction < 0)
+            docs = docs[self._skip:]
+            if self._limit:
+                docs = docs[:self._limit]
+            self._docs = [_project(doc, self._projection) for doc in docs]
+            self._position = 0
+
+    async def to_list(self, length=None):
+        self._materialize()
+        end = len(self._docs) if length is None else self._position + length
+        batch = self._docs[self._position:end]
+        self._position += len(batch)
+        await asyncio.sleep(0)
+        return batch
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        self._materialize()
+        if self._position >= len(self._docs):
+            raise StopAsyncIteration
+        doc = self._docs[self._position]
+        self._position += 1
+        return doc
+
+
+class FakeCollection:
+    """Subset of AsyncIOMotorCollection backed by a list"""
+
+    def __init__(self, name: str = "collection"):
+        self.name = name
+        self.docs: List[Dict] = []
+        self.indexes: List[Any] = []
+        self._ids: Dict[Any, Dict] = {}  # _id -> doc, for {"_id": value} updates
+        # token -> docs, standing in for the multikey index on chunk tokens (set at insert only)
+        self._tokens: Dict[str, List[Dict]] = {}
+
+    def _add(self, doc):
+        self.docs.append(doc)
+        self._ids[doc["_id"]] = doc
+        if isinstance(doc.get("tokens"), list):
+            for token in doc["tokens"]:
+                self._tokens.setdefault(token, []).append(doc)
+
+    def _candidates(self, query) -> List[Dict]:
+        """Docs that can match, narrowed by _id or tokens like Mongo's indexes would; otherwise a scan"""
+        if not query:
+            return self.docs
+        cond = query.get("_id", _MISSING)
+        if cond is not _MISSING:
+            ids = cond.get("$in") if isinstance(cond, dict) else [cond]
+            if ids is not None:
+                return [self._ids[_id] for _id in ids if _id in self._ids]
+        cond = query.get("tokens")
+        if isinstance(cond, dict) and "$in" in cond:
+            hit = {id(doc) for token in cond["$in"] for doc in self._tokens.get(token, ())}
+            return [doc for doc in self.docs if id(doc) in hit]
+        return self.docs
+
+    def find(self, query=None, projection=None):
+        query = _prepare(query)
+        return FakeCursor([doc for doc in self._candidates(query) if _matches(doc, query)], projection)
+
+    async def find_one(self, query=None, projection=None):
+        query = _prepare(query)
+        for doc in self._candidates(query):
+            if _matches(doc, query):
+                return _project(doc, projection)
+        return None
+
+    async def count_documents(self, query=None):
+        query = _prepare(query)
+        return sum(1 for doc in self._candidates(query) if _matches(doc, query))
+
+    async def insert_one(self, doc):
+        doc.setdefault("_id", ObjectId())
+        self._add(copy.deepcopy(doc))
+        return _Result(inserted_id=doc["_id"])
+
+    async def insert_many(self, docs, ordered=True):
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+            self._add(copy.deepcopy(doc))
+        return _Result(inserted_ids=[doc["_id"] for doc in docs])
+
+    def _apply(self, doc, update, inserting):
+        for op, fields in update.items():
+            for path, value in fields.items():
+                if op == "$set" or (op == "$setOnInsert" and inserting):
+                    _set_path(doc, path, copy.deepcopy(value))
+                elif op == "$inc":
+                    current = _get_path(doc, path)
+                    _set_path(doc, path, (0 if current is _MISSING else current) + value)
+                elif op == "$addToSet":
+                    current = _get_path(doc, path)
+                    current = [] if current is _MISSING else current
+                    if value not in current:
+                        current.append(value)
+                    _set_path(doc, path, current)
+                elif op != "$setOnInsert":
+                    raise NotImplementedError(f"Update operator {op}")
+
+    async def update_one(self, query, update, upsert=False):
+        candidates = self.docs
+        if list(query) == ["_id"] and not isinstance(query["_id"], dict):
+            candidates = [self._ids[query["_id"]]] if query["_id"] in self._ids else []
+        for doc in candidates:
+            if _matches(doc, query):
+                self._apply(doc, update, inserting=False)
+                return _Result(matched_count=1, upserted_id=None)
+        if not upsert:
+            return _Result(matched_count=0, upserted_id=None)
+        doc = {key: value for key, value in query.items() if not isinstance(value, dict)}
+        doc.setdefault("_id", ObjectId())
+        self._apply(doc, update, inserting=True)
+        self._add(doc)
+        return _Result(matched_count=0, upserted_id=doc["_id"])
+
+    async def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            await self.update_one(request._filter, request._doc, upsert=request._upsert)
+        return _Result(acknowledged=True)
+
+    async def delete_many(self, query):
+        query = _prepare(query)
+        before = len(self.docs)
+        docs, self.docs, self._ids, self._tokens = self.docs, [], {}, {}
+        for doc in docs:
+            if not _matches(doc, query):
+                self._add(doc)
+        return _Result(deleted_count=before - len(self.docs))
+
+    async def create_index(self, keys, **kwargs):
+        self.indexes.append((keys, kwargs))
+        return kwargs.get("name", str(keys))
+
+
+# ---------------------------------------------------------------- Redis
+
+class FakePipeline:
+    def __init__(self, redis: "FakeRedis"):
+        self._redis = redis
+        self._calls = []
+        self._immediate = False
+
+    async def watch(self, *keys):
+        # Like redis-py: commands run immediately until multi(). Nothing else runs
+        # between awaits of one coroutine here, so watched keys never conflict
+        self._immediate = True
+
+    def multi(self):
+        self._immediate = False
+
+    def __getattr__(self, name):
+        method = getattr(self._redis, name)
+        if self._immediate:
+            return method
+
+        def queue(*args, **kwargs):
+            self._calls.append((method, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        calls, self._calls = self._calls, []
+        return [await method(*args, **kwargs) for method, args, kwargs in calls]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeRedis:
+    """Subset of redis.asyncio.Redis (decode_responses=True) kept in process memory"""
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._expiry: Dict[str, float] = {}
+        self._list_pushed = asyncio.Event()
+
+    def _live(self, key):
+        expires = self._expiry.get(key)
+        if expires is not None and time.monotonic() >= expires:
+            self._data.pop(key, None)
+            self._expiry.pop(key, None)
+        return self._data.get(key)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def ping(self):
+        return True
+
+    async def get(self, key):
+        return self._live(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and self._live(key) is not None:
+            return None
+        self._data[key] = str(value)
+        self._expiry.pop(key, None)
+        if ex:
+            self._expiry[key] = time.monotonic() + ex
+        return True
+
+    async def delete(self, *keys):
+        count = 0
+        for key in keys:
+            if self._live(key) is not None:
+                count += 1
+            self._data.pop(key, None)
+            self._expiry.pop(key, None)
+        return count
+
+    async def incr(self, key, amount=1):
+        value = int(self._live(key) or 0) + amount
+        self._data[key] = str(value)
+        return value
+
+    async def expire(self, key, seconds):
+        if self._live(key) is None:
+            return False
+        self._expiry[key] = time.monotonic() + seconds
+        return True
+
+    async def keys(self, pattern="*"):
+        return [key for key in list(self._data) if self._live(key) is not None and fnmatch.fnmatch(key, pattern)]
+
+    def _list(self, key):
+        value = self._live(key)
+        if value is None:
+            value = self._data[key] = []
+        return value
+
+    async def rpush(self, key, *values):
+        items = self._list(key)
+        items.extend(str(v) for v in values)
+        self._list_pushed.set()
+        return len(items)
+
+    async def lpush(self, key, *values):
+        items = self._list(key)
+        for value in values:
+            items.insert(0, str(value))
+        self._list_pushed.set()
+        return len(items)
+
+    async def llen(self, key):
+        return len(self._live(key) or [])
+
+    @staticmethod
+    def _slice(items, start, end):
+        n = len(items)
+        start = max(start + n if start < 0 else start, 0)
+        end = end + n if end < 0 else end
+        return start, min(end, n - 1)
+
+    async def lrange(self, key, start, end):
+        items = self._live(key) or []
+        start, end = self._slice(items, start, end)
+        return list(items[start:end + 1])
+
+    async def ltrim(self, key, start, end):
+        items = self._live(key) or []
+        start, end = self._slice(items, start, end)
+        self._data[key] = items[start:end + 1]
+        return True
+
+    async def lpop(self, key, count=None):
+        items = self._live(key) or []
+        if count is None:
+            return items.pop(0) if items else None
+        popped, self._data[key] = items[:count], items[count:]
+        return popped
+
+    async def blpop(self, keys, timeout=0):
+        keys = [keys] if isinstance(keys, str) else keys
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            for key in keys:
+                items = self._live(key)
+                if items:
+                    return key, items.pop(0)
+            self._list_pushed.clear()
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(self._list_pushed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+
+    async def blmove(self, first_list, second_list, timeout, src="LEFT", dest="RIGHT"):
+        item = await self.blpop(first_list, timeout) if src == "LEFT" else None
+        if item is None:
+            return None
+        await (self.rpush if dest == "RIGHT" else self.lpush)(second_list, item[1])
+        return item[1]
+
+    async def lrem(self, key, count, value):
+        items = self._live(key) or []
+        removed = 0
+        for i in range(len(items) - 1, -1, -1) if count < 0 else range(len(items)):
+            if i < len(items) and items[i] == str(value) and (not count or removed < abs(count)):
+                del items[i]
+                removed += 1
+        return removed
+
+    def _zset(self, key):
+        value = self._live(key)
+        if value is None:
+            value = self._data[key] = {}
+        return value
+
+    async def zadd(self, key, mapping, nx=False, xx=False):
+        scores = self._zset(key)
+        added = 0
+        for member, score in mapping.items():
+            if (nx and member in scores) or (xx and member not in scores):
+                continue
+            added += member not in scores
+            scores[member] = float(score)
+        return added
+
+    async def zscore(self, key, member):
+        return (self._live(key) or {}).get(member)
+
+    async def zrem(self, key, *members):
+        scores = self._live(key) or {}
+        return sum(scores.pop(member, None) is not None for member in members)
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        table = self._live(key)
+        if table is None:
+            table = self._data[key] = {}
+        if field is not None:
+            table[field] = str(value)
+        for k, v in (mapping or {}).items():
+            table[k] = str(v)
+        return len(mapping or {}) + (field is not None)
+
+    async def hgetall(self, key):
+        return dict(self._live(key) or {})
+
+    async def close(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+# ---------------------------------------------------------------- Embeddings
+
+class FakeEmbeddings:
+    """Deterministic hashed bag-of-words embeddings; no model weights needed"""
+
+    model_name = "fake-hash-embeddings"
+
+    def __init__(self, dim: int = 384, seconds_per_text: float = 0.0):
+        self.dim = dim
+        self.seconds_per_text = seconds_per_text
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            h = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:8], "little")
+            vector[h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        if self.seconds_per_text:
+            time.sleep(self.seconds_per_text * len(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
@@ -0,0 +1,85 @@
+"""Import-time profile of the API module, for catching cold-start regressions in CI.
+
+Imports main in a fresh interpreter under `python -X importtime`, then reports the
+total time and the slowest modules as JSON:
+
+    python -m bench.import_time --max-ms 1500 --output import_time.json
+
+Exits non-zero when the import takes longer than --max-ms, or when a module that
+should only load on first use (torch, langchain, ...) is imported at startup.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Heavy modules that must stay behind lazy imports
+DEFERRED_MODULES = (
+    "torch", "transformers", "sentence_transformers", "langchain", "langchain_community",
+    "langchain_huggingface", "onnxruntime", "chromadb", "PyPDF2", "docx", "pptx",
+)
+
+
+def profile(module: str, repeat: int):
+    """Runs the import `repeat` times; returns per-module cumulative microseconds of the fastest run"""
+    env = {**os.environ, "LLM_PROVIDER": os.getenv("LLM_PROVIDER", "fake"),
+           "INGEST_QUEUE": os.getenv("INGEST_QUEUE", "local")}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=root, env=env, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+        modules = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                modules[name.strip()] = int(cumulative)
+        if best is None or modules.get(module, 0) < best.get(module, 0):
+            best = modules
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of the API module")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--repeat", type=int, default=3, help="best of N fresh interpreters")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail above this total import time")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    modules = profile(args.module, args.repeat)
+    total_ms = modules.get(args.module, 0) / 1000
+    top_level = {name: us for name, us in modules.items() if "." not in name and name != args.module}
+    loaded_deferred = sorted(name for name in DEFERRED_MODULES if name in modules)
+
+    report = {
+        "module": args.module,
+        "total_ms": round(total_ms, 1),
+        "max_ms": args.max_ms,
+        "slowest": [
+            {"module": name, "ms": round(us / 1000, 1)}
+            for name, us in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        ],
+        "deferred_modules_loaded": loaded_deferred,
+    }
+    report["ok"] = not loaded_deferred and (args.max_ms is None or total_ms <= args.max_ms)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
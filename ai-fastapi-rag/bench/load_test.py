@@ -0,0 +1,307 @@
+"""End-to-end load benchmark for the FastAPI app.
+
+Runs the real app in process against in-memory fakes for Mongo, Redis and the LLM
+(and optionally the embedding model), drives concurrent load through ASGI and
+prints machine-readable JSON:
+
+    python -m bench.load_test --requests 200 --concurrency 20 --output bench.json
+
+Use --real-embeddings to include MiniLM inference in the numbers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+WORDS = (
+    "invoice contract payment schedule delivery warranty clause liability termination notice "
+    "customer supplier product service report quarter revenue margin forecast budget policy "
+    "security access audit compliance incident response backup recovery network storage"
+).split()
+
+
+def _percentiles(values):
+    if not values:
+        return {}
+    values = np.asarray(values) * 1000
+    return {
+        "count": int(len(values)),
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+def build_app(args):
+    """Imports main with every external service swapped for an in-process fake"""
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["FAKE_LLM_TOKENS_PER_SECOND"] = str(args.llm_tokens_per_second)
+    os.environ["FAKE_LLM_FIRST_TOKEN_DELAY"] = str(args.llm_first_token_delay)
+    os.environ.setdefault("INGEST_QUEUE", "local")
+    # One process plays API and ingestion worker, so it runs the jobs whichever queue is used
+    os.environ.setdefault("INGEST_WORKERS", "1")
+    os.environ.setdefault("VECTOR_INDEX_BACKEND", "exact")
+    os.environ.setdefault("RATE_LIMIT_BACKEND", "local")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    from bench.fakes import FakeCollection, FakeRedis, FakeEmbeddings
+    import db.mongo as mongo
+    for name in list(vars(mongo)):
+        if name.endswith("_collection"):
+            setattr(mongo, name, FakeCollection(name))
+
+    import redis.asyncio
+    fake_redis = FakeRedis()
+    redis.asyncio.from_url = lambda *a, **k: fake_redis
+
+    if not args.real_embeddings:
+        from rag import embedder
+        embedder._models[embedder.DEFAULT_MODEL_NAME] = FakeEmbeddings(seconds_per_text=args.embed_seconds_per_text)
+
+    import main
+    return main, mongo
+
+
+class ASGIClient:
+    """Minimal ASGI driver that records when the first body chunk arrives"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method, path, headers=None, body=b""):
+        headers = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+        path, _, query = path.partition("?")
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": query.encode(), "root_path": "", "headers": headers,
+            "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+        }
+        finished = asyncio.Event()
+        sent_request = False
+        result = {"status": None, "chunks": [], "first_chunk": None}
+        start = time.perf_counter()
+
+        async def receive():
+            nonlocal sent_request
+            if not sent_request:
+                sent_request = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                result["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                if chunk:
+                    if result["first_chunk"] is None:
+                        result["first_chunk"] = time.perf_counter() - start
+                    result["chunks"].append(chunk)
+                if not message.get("more_body", False):
+                    finished.set()
+
+        await self.app(scope, receive, send)
+        finished.set()
+        result["total"] = time.perf_counter() - start
+        result["body"] = b"".join(result["chunks"])
+        return result
+
+    async def lifespan(self):
+        """Starts the app; returns a coroutine function that shuts it down"""
+        events = asyncio.Queue()
+        started = asyncio.Event()
+        stopped = asyncio.Event()
+        await events.put({"type": "lifespan.startup"})
+
+        async def receive():
+            return await events.get()
+
+        async def send(message):
+            if message["type"].startswith("lifespan.startup"):
+                started.set()
+            elif message["type"].startswith("lifespan.shutdown"):
+                stopped.set()
+
+        task = asyncio.create_task(self.app({"type": "lifespan", "asgi": {"version": "3.0"}}, receive, send))
+        await started.wait()
+
+        async def shutdown():
+            await events.put({"type": "lifespan.shutdown"})
+            await stopped.wait()
+            await task
+        return shutdown
+
+
+def _encode(data=None, files=None, json_body=None):
+    import httpx
+    request = httpx.Request("POST", "http://bench/", data=data, files=files, json=json_body)
+    return dict(request.headers), request.read()
+
+
+def synthetic_document(words: int, seed: int) -> str:
+    rng = random.Random(seed)
+    sentences = []
+    for i in range(0, words, 12):
+        sentence = " ".join(rng.choice(WORDS) for _ in range(11))
+        sentences.append(f"{sentence} REF-{seed}-{i}.")
+    return " ".join(sentences)
+
+
+async def run_load(total, concurrency, make_request):
+    """Runs make_request(i) total times with at most concurrency in flight"""
+    results = []
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            try:
+                results.append(await make_request(i))
+            except Exception as e:
+                results.append({"error": str(e)})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results, time.perf_counter() - start
+
+
+def summarize(results, duration):
+    ok = [r for r in results if r.get("status") and r["status"] < 400]
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "duration_s": round(duration, 3),
+        "req_per_s": round(len(results) / duration, 2) if duration else None,
+        "latency_ms": _percentiles([r["total"] for r in ok]),
+        "first_chunk_ms": _percentiles([r["first_chunk"] for r in ok if r.get("first_chunk") is not None]),
+    }
+
+
+async def benchmark(args):
+    main, mongo = build_app(args)
+    from auth.auth import SECRET_KEY, ALGORITHM
+    from jose import jwt
+
+    client = ASGIClient(main.app)
+    shutdown = await client.lifespan()
+    report = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "scenarios": {},
+        "checks": {},
+    }
+
+    try:
+        email = "bench@example.com"
+        await mongo.users_collection.insert_one({"email": email, "username": "bench"})
+        token = jwt.encode({"sub": email, "exp": datetime.utcnow() + timedelta(hours=1)}, SECRET_KEY, algorithm=ALGORITHM)
+        auth = {"Authorization": f"Bearer {token}"}
+
+        headers, body = _encode(json_body={"chat_name": "bench"})
+        response = await client.request("POST", "/chat", {**auth, **headers}, body)
+        chat_id = json.loads(response["body"])["chat_id"]
+
+        # /process: upload latency, then time each ingestion stage by polling the job
+        async def process(i):
+            document = synthetic_document(args.document_words, i).encode()
+            headers, body = _encode(data={"chat_id": chat_id}, files={"file": (f"doc{i}.txt", document, "text/plain")})
+            result = await client.request("POST", "/process", {**auth, **headers}, body)
+            if result["status"] >= 400:
+                return result
+            job_id = json.loads(result["body"])["job_id"]
+            seen = {}
+            start = time.perf_counter()
+            while True:
+                status = await client.request("GET", f"/process/{job_id}", auth)
+                job = json.loads(status["body"])
+                seen.setdefault(job["stage"], time.perf_counter() - start)
+                if job["status"] in ("done", "failed"):
+                    break
+                await asyncio.sleep(0.01)
+            result["ingest"] = time.perf_counter() - start
+            result["stages"] = seen
+            result["job_status"] = job["status"]
+            return result
+
+        results, duration = await run_load(args.uploads, min(args.concurrency, args.uploads), process)
+        summary = summarize(results, duration)
+        done = [r for r in results if r.get("job_status") == "done"]
+        summary["jobs_failed"] = sum(1 for r in results if r.get("job_status") == "failed")
+        summary["ingest_ms"] = _percentiles([r["ingest"] for r in done])
+        stages = {}
+        for r in done:
+            marks = sorted(r["stages"].items(), key=lambda item: item[1]) + [("end", r["ingest"])]
+            for (stage, at), (_, next_at) in zip(marks, marks[1:]):
+                stages.setdefault(stage, []).append(next_at - at)
+        summary["stages_ms"] = {stage: _percentiles(values) for stage, values in stages.items()}
+        report["scenarios"]["process"] = summary
+
+        # Same bytes again: the cached ingest path must report its real duration
+        from helper.metrics import stage_seconds
+        result = await process(0)
+        recorded, count = stage_seconds.total(stage="ingest_total", cached=True)
+        wall = result.get("ingest")
+        report["checks"]["cached_ingest_total"] = {
+            "wall_ms": round(wall * 1000, 3) if wall is not None else None,
+            "recorded_ms": round(recorded * 1000, 3),
+            "ok": bool(count == 1 and wall is not None and recorded <= wall + 0.05),
+        }
+
+        # /ask: streaming answers; unique questions unless --repeat-questions
+        async def ask(i):
+            question = f"What does the {random.choice(WORDS)} clause say about REF-{i % args.uploads}-0?"
+            if not args.repeat_questions:
+                question += f" ({i})"
+            headers, body = _encode(data={"question": question, "chat_id": chat_id})
+            return await client.request("POST", "/ask", {**auth, **headers}, body)
+
+        results, duration = await run_load(args.requests, args.concurrency, ask)
+        report["scenarios"]["ask"] = summarize(results, duration)
+
+        for name, path in (("chats", "/chats"), ("chat_summary", f"/chat_summary/{chat_id}")):
+            results, duration = await run_load(
+                args.requests, args.concurrency, lambda i, path=path: client.request("GET", path, auth)
+            )
+            report["scenarios"][name] = summarize(results, duration)
+    finally:
+        await shutdown()
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark with in-process fakes")
+    parser.add_argument("--requests", type=int, default=100, help="requests per read scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--uploads", type=int, default=5, help="documents uploaded through /process")
+    parser.add_argument("--document-words", type=int, default=3000)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200)
+    parser.add_argument("--llm-first-token-delay", type=float, default=0.05)
+    parser.add_argument("--embed-seconds-per-text", type=float, default=0.0,
+                        help="simulated CPU cost of the fake embedder")
+    parser.add_argument("--real-embeddings", action="store_true", help="load the real MiniLM model")
+    parser.add_argument("--repeat-questions", action="store_true", help="let the answer cache hit")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+    sys.exit(0 if all(check["ok"] for check in report["checks"].values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
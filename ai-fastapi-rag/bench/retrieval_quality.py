@@ -0,0 +1,268 @@
+"""Retrieval quality-vs-latency benchmark for rag/retriever.py.
+
+Builds synthetic (or fixture) corpora at several sizes, stores them with
+store_documents against the in-memory Mongo stand-in, queries them with
+retrieve_similar_docs under each configuration and reports, as JSON:
+
+- recall@k against exact search (brute force over the full-precision embeddings)
+- QPS with --concurrency queries in flight, and sequential latency percentiles
+- memory (process RSS before and after building and loading the index)
+- build time (store_documents for the whole corpus, embedding included)
+
+    python -m bench.retrieval_quality --sizes 1000,10000 \\
+        --configs exact/vector,exact/hybrid,exact/vector/int8,hnsw/vector --output retrieval.json
+
+A configuration is index backend/retrieval mode[/embedding storage], i.e.
+VECTOR_INDEX_BACKEND, RETRIEVAL_MODE and EMBEDDING_STORAGE; other knobs
+(HNSW_EF_SEARCH, VECTOR_CANDIDATES, ...) are read from the environment as usual.
+Each (size, configuration) runs in a fresh interpreter so memory numbers and
+module-level settings don't leak between runs.
+
+Latency includes the stand-in's linear scans, which grow with the corpus, so
+compare configurations at the same size rather than reading absolute numbers.
+Sizes up to 1M chunks work but need several GB of RAM and a long build.
+Exits non-zero when a run fails or a recall falls below --min-recall.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench.load_test import synthetic_document, run_load, _percentiles
+
+CHUNK_WORDS = 50  # about the splitter's 300 characters
+QUERY_WORDS = 8
+
+
+def synthetic_corpus(size: int, seed: int):
+    words = synthetic_document(size * CHUNK_WORDS, seed).split()
+    return [" ".join(words[i:i + CHUNK_WORDS]) for i in range(0, len(words), CHUNK_WORDS)][:size]
+
+
+def fixture_corpus(path: str, size: int):
+    """Chunks of a text file, or of every .txt/.md file under a directory, split like /process does"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=50)
+    if os.path.isdir(path):
+        paths = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(path) for name in names
+            if name.endswith((".txt", ".md"))
+        )
+    else:
+        paths = [path]
+    chunks = []
+    for file_path in paths:
+        with open(file_path, encoding="utf-8", errors="ignore") as f:
+            chunks.extend(splitter.split_text(f.read()))
+        if len(chunks) >= size:
+            break
+    # store_documents drops repeated chunks, so the corpus must not contain any
+    return list(dict.fromkeys(chunk for chunk in chunks if chunk.strip()))[:size]
+
+
+def make_queries(chunks, count: int, seed: int):
+    """Short word windows taken from random chunks"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        words = rng.choice(chunks).split()
+        start = rng.randrange(max(1, len(words) - QUERY_WORDS))
+        queries.append(" ".join(words[start:start + QUERY_WORDS]))
+    return queries
+
+
+def _rss_mb():
+    """Current resident memory (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+    except (OSError, ValueError):
+        return None
+
+
+def _dir_mb(path: str):
+    total = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    return round(total / 2 ** 20, 2)
+
+
+class RecordingEmbeddings:
+    """Passes calls through and keeps each stored chunk's full-precision vector for the exact search"""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.cache_namespace = getattr(inner, "cache_namespace", None) or getattr(inner, "model_name", "default")
+        self.vectors = {}
+
+    async def aembed_documents(self, texts):
+        vectors = await self.inner.aembed_documents(texts)
+        self.vectors.update(zip(texts, vectors))
+        return vectors
+
+    async def aembed_query(self, text):
+        return await self.inner.aembed_query(text)
+
+
+def exact_top_k(vectors, query_vectors, k: int):
+    """Ground truth: the k most cosine-similar chunk texts for each query"""
+    texts = list(vectors)
+    matrix = np.asarray([vectors[text] for text in texts], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+    truth = []
+    for query in query_vectors:
+        query = np.asarray(query, dtype=np.float32)
+        sims = matrix @ (query / (np.linalg.norm(query) + 1e-12))
+        top = np.argpartition(-sims, min(k, len(sims)) - 1)[:k]
+        truth.append({texts[i] for i in top})
+    return truth
+
+
+async def run_one(size: int, config: str, args):
+    """Builds one corpus under one configuration and measures it (runs in its own interpreter)"""
+    backend, mode, *storage = config.split("/")
+    chroma_path = tempfile.mkdtemp(prefix="retrieval_bench_")
+    os.environ["VECTOR_INDEX_BACKEND"] = backend
+    os.environ["RETRIEVAL_MODE"] = mode
+    os.environ["CHROMA_PATH"] = chroma_path
+    if storage:
+        os.environ["EMBEDDING_STORAGE"] = storage[0]
+
+    from bench.fakes import FakeCollection, FakeEmbeddings
+    import db.mongo as mongo
+    for name in list(vars(mongo)):
+        if name.endswith("_collection"):
+            setattr(mongo, name, FakeCollection(name))
+    from rag.retriever import store_documents, retrieve_similar_docs
+
+    if args.real_embeddings:
+        from rag.embedder import aget_embedding_function
+        embed_fn = RecordingEmbeddings(await aget_embedding_function())
+    else:
+        embed_fn = RecordingEmbeddings(FakeEmbeddings())
+
+    chunks = fixture_corpus(args.fixture, size) if args.fixture else synthetic_corpus(size, args.seed)
+    queries = make_queries(chunks, args.queries, args.seed)
+    user_id, chat_id = "bench-user", f"bench-{size}"
+
+    try:
+        rss_start = _rss_mb()
+        start = time.perf_counter()
+        for i in range(0, len(chunks), args.batch_size):
+            await store_documents(chunks[i:i + args.batch_size], embed_fn, user_id, chat_id)
+        build_s = time.perf_counter() - start
+
+        query_vectors = [await embed_fn.aembed_query(query) for query in queries]
+        truth = exact_top_k(embed_fn.vectors, query_vectors, args.k)
+
+        async def search(i):
+            return await retrieve_similar_docs(queries[i], embed_fn, user_id, chat_id, top_k=args.k,
+                                               question_embedding=query_vectors[i])
+
+        # The first query loads the index (matrix cache, HNSW segment) and is reported separately
+        start = time.perf_counter()
+        await search(0)
+        cold_s = time.perf_counter() - start
+        rss_loaded = _rss_mb()
+
+        latencies, recalls = [], []
+        for i in range(len(queries)):
+            start = time.perf_counter()
+            result = await search(i)
+            latencies.append(time.perf_counter() - start)
+            recalls.append(len(set(result["documents"][:args.k]) & truth[i]) / len(truth[i]))
+
+        _, duration = await run_load(len(queries), args.concurrency, search)
+
+        result = {
+            "chunks": len(embed_fn.vectors),
+            "recall_at_k": round(float(np.mean(recalls)), 4),
+            "recall_at_k_min": round(float(np.min(recalls)), 4),
+            "qps": round(len(queries) / duration, 1),
+            "latency_ms": _percentiles(latencies),
+            "cold_query_ms": round(cold_s * 1000, 3),
+            "build_s": round(build_s, 3),
+            "rss_mb": rss_loaded,
+            "rss_growth_mb": round(rss_loaded - rss_start, 1) if rss_start is not None else None,
+        }
+        if backend == "hnsw":
+            result["index_disk_mb"] = _dir_mb(chroma_path)
+        return result
+    finally:
+        shutil.rmtree(chroma_path, ignore_errors=True)
+
+
+def run_isolated(size: int, config: str):
+    """Runs one (size, configuration) in a fresh interpreter with this script's arguments"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-m", "bench.retrieval_quality", *sys.argv[1:],
+         "--run-size", str(size), "--run-config", config],
+        cwd=root, capture_output=True, text=True
+    )
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        return {"error": result.stderr.strip()[-2000:] or f"exit code {result.returncode}"}
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval recall vs. latency per index configuration")
+    parser.add_argument("--sizes", default="1000,10000", help="corpus sizes in chunks")
+    parser.add_argument("--configs", default="exact/vector,exact/hybrid,exact/vector/int8,hnsw/vector",
+                        help="backend/mode[/storage] list")
+    parser.add_argument("--fixture", help="text file or directory of .txt/.md files instead of synthetic text")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5, help="top_k passed to the retriever and scored for recall")
+    parser.add_argument("--concurrency", type=int, default=8, help="queries in flight for the QPS pass")
+    parser.add_argument("--batch-size", type=int, default=1000, help="chunks per store_documents call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--real-embeddings", action="store_true", help="load the real MiniLM model")
+    parser.add_argument("--min-recall", type=float, default=None, help="fail below this mean recall@k")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--run-config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size is not None:
+        result = asyncio.run(run_one(args.run_size, args.run_config, args))
+        sys.stdout.write(json.dumps(result) + "\n")
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    configs = [config.strip() for config in args.configs.split(",") if config.strip()]
+    report = {
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "run_size", "run_config")},
+        "sizes": {},
+    }
+    failed = False
+    for size in sizes:
+        report["sizes"][str(size)] = {}
+        for config in configs:
+            result = run_isolated(size, config)
+            if "error" in result:
+                failed = True
+            elif args.min_recall is not None and result["recall_at_k"] < args.min_recall:
+                result["recall_ok"] = False
+                failed = True
+            report["sizes"][str(size)][config] = result
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
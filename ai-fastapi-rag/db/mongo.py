@@ -1,11 +1,16 @@
 # backend/db/mongo.py
 
+import logging
 import motor.motor_asyncio
 import os
 from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 MONGO_URI = os.getenv("MONGO_DB_URI")
 DB_NAME = os.getenv("DB_NAME", "document_qna")
 
@@ -16,6 +21,32 @@ users_collection = db["users"]
 documents_collection = db["documents"]
 chunks_collection = db["chunks"]
 chats_collection = db["chats"]
+# Content-addressed caches: chunk text hash -> embedding, file hash -> chunks and summary
+embedding_cache_collection = db["embedding_cache"]
+file_cache_collection = db["file_cache"]
+# Per-chat BM25 statistics (chunk count, total length, document frequency per term)
+chat_terms_collection = db["chat_terms"]
 
 # Collections you can now access like:
-# db.users, db.documents, db.chunks, db.chats
\ No newline at end of file
+# db.users, db.documents, db.chunks, db.chats
+
+
+async def ensure_indexes():
+    """Creates the indexes the app's queries rely on; safe to run on every startup"""
+    indexes = [
+        # Chunk fetches for a chat (exact search, backfill; served by the prefix) and per-chat
+        # dedup by content hash
+        (documents_collection, [("user_id", ASCENDING), ("chat_id", ASCENDING), ("chunk_hash", ASCENDING)], {}),
+        # Multikey index over chunk tokens for the lexical (BM25) candidate lookup
+        (documents_collection, [("user_id", ASCENDING), ("chat_id", ASCENDING), ("tokens", ASCENDING)], {}),
+        # Chat lookups by id and the user's chat list, newest first (chat_id breaks ties for paging)
+        (chats_collection, [("chat_id", ASCENDING)], {"unique": True}),
+        (chats_collection, [("user_id", ASCENDING), ("created_at", DESCENDING), ("chat_id", DESCENDING)], {}),
+        (users_collection, [("email", ASCENDING)], {}),
+    ]
+    for collection, keys, options in indexes:
+        try:
+            await collection.create_index(keys, **options)
+        except PyMongoError as e:
+            # Existing data (e.g. duplicate chat ids) should not stop the app from starting
+            logger.error(f"Could not create index {keys} on {collection.name}: {str(e)}")
@@ -0,0 +1,185 @@
+"""Priority-aware admission control in front of LLM calls.
+
+A controller lets at most `capacity` callers hold a slot at once. Callers that
+can't run yet wait in bounded queues: interactive work (/ask) is always admitted
+before background work (document and memory summaries), some slots are reserved
+for interactive work, and within a priority users take turns round-robin so one
+user's burst can't starve everyone else. When a queue is full or a wait runs too
+long, admission fails fast with Overloaded, which the API turns into a 429/503
+with a Retry-After hint.
+
+Limits are per process; with several uvicorn workers size them per worker.
+"""
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+import asyncio
+import logging
+import math
+import os
+import time
+
+from helper.metrics import events_total, observe_stage, register_gauges
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "16"))
+# Slots background work may never take, so /ask keeps a fast lane during ingestion bursts
+LLM_RESERVED_INTERACTIVE = int(os.getenv("LLM_RESERVED_INTERACTIVE", str(max(1, LLM_CONCURRENCY // 4))))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "64"))  # waiters per priority
+LLM_QUEUE_PER_USER = int(os.getenv("LLM_QUEUE_PER_USER", "4"))
+LLM_ADMISSION_MAX_WAIT = float(os.getenv("LLM_ADMISSION_MAX_WAIT", "10"))
+
+
+class Overloaded(Exception):
+    """Admission refused; status_code is 429 (this caller sends too much) or 503 (server saturated)"""
+
+    def __init__(self, resource: str, status_code: int, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.resource = resource
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class AdmissionTicket:
+    """A held slot; release() is idempotent so both a stream's finally and a fallback can call it"""
+
+    def __init__(self, controller: "AdmissionController", priority: int):
+        self._controller = controller
+        self._priority = priority
+        self._start = time.perf_counter()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self._priority, time.perf_counter() - self._start)
+
+
+class AdmissionController:
+    def __init__(self, name: str, capacity: int, reserved_interactive: int = 0,
+                 max_queue: int = 64, max_queue_per_user: int = 4):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.background_limit = max(1, self.capacity - reserved_interactive)
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self._active = {INTERACTIVE: 0, BACKGROUND: 0}
+        # priority -> user -> waiting futures; dict order is the round-robin order
+        self._waiters: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            INTERACTIVE: OrderedDict(), BACKGROUND: OrderedDict()
+        }
+        self._queued = {INTERACTIVE: 0, BACKGROUND: 0}
+        # Moving average of how long a slot is held, for Retry-After estimates
+        self._hold_seconds = 1.0
+        register_gauges(self.stats)
+
+    def stats(self) -> Dict[str, float]:
+        prefix = f"rag_admission_{self.name}"
+        return {
+            f"{prefix}_capacity": self.capacity,
+            f"{prefix}_active_interactive": self._active[INTERACTIVE],
+            f"{prefix}_active_background": self._active[BACKGROUND],
+            f"{prefix}_queued_interactive": self._queued[INTERACTIVE],
+            f"{prefix}_queued_background": self._queued[BACKGROUND],
+        }
+
+    def _can_run(self, priority: int) -> bool:
+        if sum(self._active.values()) >= self.capacity:
+            return False
+        return priority == INTERACTIVE or self._active[BACKGROUND] < self.background_limit
+
+    def _retry_after(self, priority: int) -> int:
+        ahead = sum(self._queued[p] for p in self._queued if p <= priority)
+        return max(1, math.ceil(self._hold_seconds * (ahead + 1) / self.capacity))
+
+    def _reject(self, priority: int, status_code: int, reason: str, detail: str):
+        events_total.inc(event="admission_rejected", resource=self.name, reason=reason,
+                         priority=PRIORITY_NAMES[priority])
+        raise Overloaded(self.name, status_code, self._retry_after(priority), detail)
+
+    async def acquire(self, priority: int = INTERACTIVE, user: Optional[str] = None,
+                      max_wait: Optional[float] = None) -> AdmissionTicket:
+        """Waits for a slot; max_wait=None waits as long as it takes"""
+        user = user or "anonymous"
+        waiting_ahead = any(self._waiters[p] for p in self._waiters if p <= priority)
+        if not waiting_ahead and self._can_run(priority):
+            self._active[priority] += 1
+            return AdmissionTicket(self, priority)
+
+        queue = self._waiters[priority]
+        if self._queued[priority] >= self.max_queue:
+            self._reject(priority, 503, "queue_full", "Server is busy, please retry shortly")
+        if len(queue.get(user, ())) >= self.max_queue_per_user:
+            self._reject(priority, 429, "user_queue_full", "Too many requests in progress")
+
+        future = asyncio.get_running_loop().create_future()
+        queue.setdefault(user, deque()).append(future)
+        self._queued[priority] += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Granted just as we gave up: hand the slot on
+                self._release(priority, 0.0, count=False)
+            else:
+                self._remove_waiter(priority, user, future)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject(priority, 503, "wait_timeout", "Server is busy, please retry shortly")
+            raise
+        observe_stage("admission_wait", time.perf_counter() - start, resource=self.name,
+                      priority=PRIORITY_NAMES[priority])
+        return AdmissionTicket(self, priority)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE, user: Optional[str] = None,
+                   max_wait: Optional[float] = None):
+        ticket = await self.acquire(priority, user, max_wait)
+        try:
+            yield
+        finally:
+            ticket.release()
+
+    def _remove_waiter(self, priority: int, user: str, future: asyncio.Future):
+        user_queue = self._waiters[priority].get(user)
+        if user_queue is not None and future in user_queue:
+            user_queue.remove(future)
+            self._queued[priority] -= 1
+            if not user_queue:
+                del self._waiters[priority][user]
+
+    def _release(self, priority: int, held_seconds: float, count: bool = True):
+        self._active[priority] -= 1
+        if count:
+            self._hold_seconds = 0.9 * self._hold_seconds + 0.1 * held_seconds
+        self._wake()
+
+    def _wake(self):
+        for priority in (INTERACTIVE, BACKGROUND):
+            queue = self._waiters[priority]
+            while queue and self._can_run(priority):
+                user, user_queue = next(iter(queue.items()))
+                future = user_queue.popleft()
+                self._queued[priority] -= 1
+                if user_queue:
+                    queue.move_to_end(user)
+                else:
+                    del queue[user]
+                if not future.done():
+                    self._active[priority] += 1
+                    future.set_result(None)
+
+
+llm_admission = AdmissionController(
+    "llm",
+    LLM_CONCURRENCY,
+    reserved_interactive=LLM_RESERVED_INTERACTIVE,
+    max_queue=LLM_QUEUE_SIZE,
+    max_queue_per_user=LLM_QUEUE_PER_USER
+)
@@ -0,0 +1,90 @@
+from datetime import datetime
+import base64
+import hashlib
+import json
+import logging
+import os
+from typing import List, Optional
+
+import numpy as np
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "200"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 60 * 60)))
+
+
+def _cache_key(chat_id: str) -> str:
+    return f"chat:{chat_id}:answer_cache"
+
+
+def _version_key(chat_id: str) -> str:
+    return f"chat:{chat_id}:doc_version"
+
+
+async def get_doc_version(redis: Redis, chat_id: str) -> int:
+    """Version of the chat's document set, bumped whenever documents are added"""
+    return int(await redis.get(_version_key(chat_id)) or 0)
+
+
+async def bump_doc_version(redis: Redis, chat_id: str) -> int:
+    """Marks the chat's documents as changed and drops its cached answers"""
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.incr(_version_key(chat_id))
+        pipe.delete(_cache_key(chat_id))
+        version, _ = await pipe.execute()
+    return version
+
+
+def memory_fingerprint(memory: str) -> str:
+    """Short hash of the conversation memory put into the prompt ("" when there is none)"""
+    return hashlib.sha256(memory.encode("utf-8")).hexdigest()[:16] if memory else ""
+
+
+async def lookup_answer(redis: Redis, chat_id: str, embedding: List[float], doc_version: int,
+                        memory_key: str = "", threshold: float = ANSWER_CACHE_THRESHOLD) -> Optional[dict]:
+    """Returns the cached answer to the most similar earlier question, if close enough.
+
+    Only answers given with the same documents and the same conversation memory
+    (memory_fingerprint) count: a follow-up like "why?" means something else once
+    the conversation has moved on.
+    """
+    entries = [json.loads(item) for item in await redis.lrange(_cache_key(chat_id), 0, -1)]
+    entries = [entry for entry in entries
+               if entry["doc_version"] == doc_version and entry.get("memory_key", "") == memory_key]
+    if not entries:
+        return None
+
+    matrix = np.vstack([
+        np.frombuffer(base64.b64decode(entry["embedding"]), dtype=np.float32) for entry in entries
+    ])
+    query = np.asarray(embedding, dtype=np.float32)
+    query = query / (np.linalg.norm(query) + 1e-12)
+    sims = matrix @ query
+    best = int(np.argmax(sims))
+    if sims[best] < threshold:
+        return None
+    return {**entries[best], "similarity": float(sims[best])}
+
+
+async def store_answer(redis: Redis, chat_id: str, question: str, embedding: List[float],
+                       answer: str, doc_version: int, memory_key: str = ""):
+    """Caches an answer keyed by its question embedding, newest first"""
+    vector = np.asarray(embedding, dtype=np.float32)
+    vector = vector / (np.linalg.norm(vector) + 1e-12)
+    entry = {
+        "question": question,
+        "answer": answer,
+        "embedding": base64.b64encode(vector.tobytes()).decode("ascii"),
+        "doc_version": doc_version,
+        "memory_key": memory_key,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    key = _cache_key(chat_id)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.lpush(key, json.dumps(entry))
+        pipe.ltrim(key, 0, ANSWER_CACHE_MAX_ENTRIES - 1)
+        pipe.expire(key, ANSWER_CACHE_TTL)
+        await pipe.execute()
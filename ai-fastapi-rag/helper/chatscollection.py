@@ -1,6 +1,11 @@
 from db.mongo import chats_collection
+import base64
+import json
 import uuid
 from datetime import datetime
+from typing import List, Optional, Tuple
+
+CHAT_LIST_FIELDS = {"_id": 0, "chat_id": 1, "chat_name": 1, "created_at": 1}
 
 async def create_chat(user_id, chat_name):
     chat_id = str(uuid.uuid4())
@@ -12,4 +17,40 @@ async def create_chat(user_id, chat_name):
         "last_asked":datetime.utcnow()
     }
     await chats_collection.insert_one(chat_doc)
-    return chat_id
\ No newline at end of file
+    return chat_id
+
+async def chat_exists(user_id: str, chat_id: str) -> bool:
+    """Ownership check that only fetches the _id from the (chat_id) index"""
+    return await chats_collection.find_one({"chat_id": chat_id, "user_id": user_id}, {"_id": 1}) is not None
+
+def encode_chat_cursor(chat: dict) -> str:
+    payload = json.dumps({"created_at": chat["created_at"].isoformat(), "chat_id": chat["chat_id"]})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_chat_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Raises ValueError for cursors this app did not issue"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(payload["created_at"]), str(payload["chat_id"])
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+async def list_chats_page(user_id: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """One page of the user's chats, newest first, plus the cursor for the next page.
+
+    Keyset pagination on (created_at, chat_id) walks the (user_id, created_at, chat_id)
+    index, so later pages cost the same as the first one.
+    """
+    query = {"user_id": user_id}
+    if cursor:
+        created_at, chat_id = decode_chat_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "chat_id": {"$lt": chat_id}}
+        ]
+    chats = await chats_collection.find(query, CHAT_LIST_FIELDS) \
+        .sort([("created_at", -1), ("chat_id", -1)]) \
+        .limit(limit + 1) \
+        .to_list(length=limit + 1)
+    next_cursor = encode_chat_cursor(chats[limit - 1]) if len(chats) > limit else None
+    return chats[:limit], next_cursor
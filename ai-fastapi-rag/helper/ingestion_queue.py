@@ -0,0 +1,263 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+INGEST_QUEUE = os.getenv("INGEST_QUEUE", "redis")  # "redis" or "local"
+QUEUE_KEY = "ingest:queue"
+# Jobs taken by a worker stay on the processing list, with a lease (deadline) in a sorted
+# set, until the worker records the outcome; a job whose lease runs out is queued again
+PROCESSING_KEY = "ingest:processing"
+LEASES_KEY = "ingest:leases"
+# Renewed every third of this while the job runs, so only a dead or stuck worker loses one
+JOB_LEASE_SECONDS = float(os.getenv("INGEST_JOB_LEASE_SECONDS", "60"))
+JOB_TTL = 24 * 60 * 60  # keep finished job status for a day
+
+# Pipeline stages, in order, as reported in a job's "stage" field
+STAGES = ["queued", "extracting", "embedding", "summarizing", "done"]
+
+
+def _job_key(job_id: str) -> str:
+    return f"ingest:job:{job_id}"
+
+
+def _new_job(fields: Dict) -> Dict:
+    now = datetime.utcnow().isoformat()
+    return {
+        **fields,
+        "job_id": str(uuid.uuid4()),
+        "status": "queued",
+        "stage": "queued",
+        "chunks_stored": 0,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+class JobQueue(ABC):
+    """Ingestion jobs plus their status records"""
+
+    # Whether queued jobs outlive the process (and so whether shutdown should requeue them)
+    durable = False
+
+    @abstractmethod
+    async def enqueue(self, fields: Dict) -> Dict:
+        """Creates a queued job from fields and returns its record"""
+
+    @abstractmethod
+    async def dequeue(self, timeout: float = 2) -> Optional[Dict]:
+        """Takes the next job, or None after timeout (kept under the Redis client's 5s socket timeout)"""
+
+    @abstractmethod
+    async def update(self, job_id: str, **fields):
+        """Merges fields into the job's status record"""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """Returns the job's status record, None if unknown or expired"""
+
+    async def renew(self, job_id: str) -> bool:
+        """Extends a running job's lease; False if it was already lost"""
+        return True
+
+    async def ack(self, job_id: str):
+        """Drops a finished job from the processing list"""
+
+    async def requeue_expired(self) -> int:
+        """Puts jobs whose worker died back on the queue; returns how many"""
+        return 0
+
+    async def requeue(self, job_id: str) -> bool:
+        """Puts a job interrupted by shutdown back at the head of the queue; False if it can't outlive the process"""
+        return False
+
+
+class RedisJobQueue(JobQueue):
+    """Job queue shared by every API and ingestion worker through Redis"""
+
+    durable = True
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+
+    async def enqueue(self, fields):
+        job = _new_job(fields)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(_job_key(job["job_id"]), json.dumps(job), ex=JOB_TTL)
+            pipe.rpush(QUEUE_KEY, job["job_id"])
+            await pipe.execute()
+        return job
+
+    async def dequeue(self, timeout=2):
+        # BLMOVE rather than BLPOP: the id stays in Redis until ack(), so a crash can't lose it
+        job_id = await self.redis.blmove(QUEUE_KEY, PROCESSING_KEY, timeout, "LEFT", "RIGHT")
+        if job_id is None:
+            return None
+        await self.redis.zadd(LEASES_KEY, {job_id: time.time() + JOB_LEASE_SECONDS})
+        job = await self.get(job_id)
+        if job is None:
+            await self.ack(job_id)
+        return job
+
+    async def update(self, job_id, **fields):
+        job = await self.get(job_id) or {"job_id": job_id}
+        job.update(fields, updated_at=datetime.utcnow().isoformat())
+        await self.redis.set(_job_key(job_id), json.dumps(job), ex=JOB_TTL)
+
+    async def get(self, job_id):
+        data = await self.redis.get(_job_key(job_id))
+        return json.loads(data) if data else None
+
+    async def renew(self, job_id):
+        # xx: don't recreate a lease requeue_expired() already took
+        await self.redis.zadd(LEASES_KEY, {job_id: time.time() + JOB_LEASE_SECONDS}, xx=True)
+        return await self.redis.zscore(LEASES_KEY, job_id) is not None
+
+    async def ack(self, job_id):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrem(PROCESSING_KEY, 1, job_id)
+            pipe.zrem(LEASES_KEY, job_id)
+            await pipe.execute()
+
+    async def requeue(self, job_id):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrem(PROCESSING_KEY, 1, job_id)
+            pipe.zrem(LEASES_KEY, job_id)
+            pipe.lpush(QUEUE_KEY, job_id)
+            await pipe.execute()
+        await self.update(job_id, status="queued", stage="queued", error="Worker shut down, retrying")
+        return True
+
+    async def requeue_expired(self):
+        now = time.time()
+        requeued = 0
+        for job_id in await self.redis.lrange(PROCESSING_KEY, 0, -1):
+            deadline = await self.redis.zscore(LEASES_KEY, job_id)
+            if deadline is None:
+                # Taken by a worker that hasn't recorded its lease yet, or died before it could
+                await self.redis.zadd(LEASES_KEY, {job_id: now + JOB_LEASE_SECONDS}, nx=True)
+            elif deadline < now and await self.redis.zrem(LEASES_KEY, job_id):
+                # zrem succeeds for one caller only, so the job is queued again once
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.lrem(PROCESSING_KEY, 1, job_id)
+                    pipe.rpush(QUEUE_KEY, job_id)
+                    await pipe.execute()
+                await self.update(job_id, status="queued", stage="queued", error="Worker lost, retrying")
+                logger.warning(f"Ingestion job {job_id} lease expired, queued again")
+                requeued += 1
+        return requeued
+
+
+class LocalJobQueue(JobQueue):
+    """In-process stand-in for RedisJobQueue (single worker, tests)"""
+
+    def __init__(self):
+        self._queue = asyncio.Queue()
+        self._jobs: Dict[str, Dict] = {}
+
+    async def enqueue(self, fields):
+        job = _new_job(fields)
+        self._jobs[job["job_id"]] = job
+        await self._queue.put(job["job_id"])
+        return dict(job)
+
+    async def dequeue(self, timeout=2):
+        try:
+            job_id = await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return await self.get(job_id)
+
+    async def update(self, job_id, **fields):
+        job = self._jobs.setdefault(job_id, {"job_id": job_id})
+        job.update(fields, updated_at=datetime.utcnow().isoformat())
+
+    async def get(self, job_id):
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def create_job_queue(redis: Redis, kind: str = INGEST_QUEUE) -> JobQueue:
+    if kind == "local":
+        return LocalJobQueue()
+    if kind == "redis":
+        return RedisJobQueue(redis)
+    raise ValueError(f"Unknown ingestion queue: {kind}")
+
+
+Handler = Callable[[Dict, Callable[..., Awaitable[None]]], Awaitable[Dict]]
+
+
+async def _keep_lease(queue: JobQueue, job_id: str):
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            if not await queue.renew(job_id):
+                logger.warning(f"Ingestion job {job_id} lost its lease and may run twice")
+                return
+        except Exception as e:
+            logger.error(f"Lease renewal failed for job {job_id}: {str(e)}")
+
+
+async def run_worker(queue: JobQueue, handler: Handler):
+    """Takes jobs off the queue forever, recording each stage as it runs.
+
+    Jobs left behind by a worker that died (expired leases) are queued again at
+    startup and then every third of a lease.
+    """
+    next_check = 0
+    while True:
+        try:
+            if time.monotonic() >= next_check:
+                await queue.requeue_expired()
+                next_check = time.monotonic() + JOB_LEASE_SECONDS / 3
+            job = await queue.dequeue()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ingestion queue error: {str(e)}")
+            await asyncio.sleep(1)
+            continue
+        if job is None:
+            continue
+
+        job_id = job["job_id"]
+        if job.get("status") in ("done", "failed"):
+            # Requeued after its lease ran out, but the first worker finished it after all
+            await queue.ack(job_id)
+            continue
+
+        async def progress(stage: str, **fields):
+            await queue.update(job_id, stage=stage, **fields)
+
+        logger.info(f"Ingestion job {job_id} started")
+        await queue.update(job_id, status="running", error=None)
+        # Tells the handler to keep its input (the upload) if it's cancelled, for the retry
+        job["requeue_on_shutdown"] = queue.durable
+        lease = asyncio.create_task(_keep_lease(queue, job_id))
+        try:
+            result = await handler(job, progress)
+            await queue.update(job_id, status="done", stage="done", **result)
+            logger.info(f"Ingestion job {job_id} done")
+        except asyncio.CancelledError:
+            # Shutdown (deploy, restart): another worker picks the job up again
+            if await queue.requeue(job_id):
+                logger.info(f"Ingestion job {job_id} interrupted by shutdown, queued again")
+            else:
+                await queue.update(job_id, status="failed", error="Worker shut down")
+            raise
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed: {str(e)}")
+            await queue.update(job_id, status="failed", error=str(e))
+        finally:
+            lease.cancel()
+            await queue.ack(job_id)
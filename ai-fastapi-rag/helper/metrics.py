@@ -0,0 +1,170 @@
+"""Lightweight in-process metrics rendered in the Prometheus text format."""
+import bisect
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+TOKEN_BUCKETS = (64, 128, 256, 512, 768, 1024, 1536, 2048, 4096)
+
+# Fraction of HTTP requests to run under cProfile (0 disables)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# cProfile allows one active profiler per process
+_profile_lock = threading.Lock()
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series: Dict[LabelKey, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def total(self, **labels) -> Tuple[float, int]:
+        """(sum, count) of one label set"""
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            return (series[1], series[2]) if series else (0.0, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._series: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._series.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+stage_seconds = Histogram("rag_stage_seconds", "Time spent in each request or ingestion stage")
+http_request_seconds = Histogram("rag_http_request_seconds", "HTTP request latency by route")
+embedding_batch_size = Histogram("rag_embedding_batch_size", "Texts per embedding model call", SIZE_BUCKETS)
+prompt_tokens = Histogram("rag_prompt_tokens", "Document tokens packed into LLM prompts", TOKEN_BUCKETS)
+events_total = Counter("rag_events_total", "Counted events (cache hits, errors, ...)")
+
+_metrics = [stage_seconds, http_request_seconds, embedding_batch_size, prompt_tokens, events_total]
+# Callables returning {metric_name: value} rendered as gauges (cache stats etc.)
+_gauge_sources: List[Callable[[], Dict[str, float]]] = []
+
+
+def register_gauges(source: Callable[[], Dict[str, float]]):
+    _gauge_sources.append(source)
+
+
+@contextmanager
+def timer(stage: str, **labels):
+    """Records the duration of the with-block in rag_stage_seconds"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage, **labels)
+
+
+def observe_stage(stage: str, seconds: float, **labels):
+    stage_seconds.observe(seconds, stage=stage, **labels)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for source in _gauge_sources:
+        try:
+            values = source()
+        except Exception as e:
+            logger.error(f"Gauge source failed: {str(e)}")
+            continue
+        for name, value in values.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def should_profile() -> bool:
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def sampled_profile(name: str):
+    """Profiles the block with cProfile; stats go to PROFILE_DIR or the debug log"""
+    if not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _profile_lock.release()
+        if PROFILE_DIR:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            safe = name.strip("/").replace("/", "_") or "root"
+            profiler.dump_stats(os.path.join(PROFILE_DIR, f"{safe}-{int(time.time() * 1000)}.prof"))
+        elif logger.isEnabledFor(logging.DEBUG):
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+            logger.debug("profile route=%s\n%s", name, out.getvalue())
@@ -0,0 +1,127 @@
+"""Per-user rate limiting shared by every worker and node through Redis.
+
+Each key is a token bucket: `count` requests of burst, refilled at count/period per
+second. The Redis version keeps the bucket in a hash updated by one Lua script
+(a single EVALSHA round trip, using Redis' clock so nodes agree). The local
+version keeps buckets in process memory, for tests and single-process runs; it is
+also used whenever Redis can't be reached, so an outage degrades to per-worker
+limits instead of failing requests.
+"""
+from typing import Optional, Tuple
+import logging
+import math
+import os
+import threading
+import time
+
+from cachetools import TTLCache
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "redis")  # "redis" or "local"
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false"
+RATE_LIMIT_PREFIX = "ratelimit"
+LOCAL_MAX_BUCKETS = 10000
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# KEYS[1]: bucket; ARGV: capacity, refill rate (tokens/s), cost
+# Returns {allowed, retry_after_seconds, tokens_left} (floats as strings)
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil or ts == nil then
+  tokens = capacity
+  ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(retry_after), tostring(tokens)}
+"""
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("Rate limit exceeded")
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def parse_limit(limit: str) -> Tuple[int, int]:
+    """'10/minute' -> (10, 60)"""
+    count, _, period = limit.partition("/")
+    period = period.strip().lower().rstrip("s")
+    if period not in _PERIODS:
+        raise ValueError(f"Unknown rate limit period: {limit}")
+    return int(count), _PERIODS[period]
+
+
+class LocalRateLimiter:
+    """Token buckets in process memory (bounded LRU/TTL, like the auth token cache)"""
+
+    def __init__(self, max_buckets: int = LOCAL_MAX_BUCKETS):
+        self._buckets = TTLCache(maxsize=max_buckets, ttl=_PERIODS["day"])
+        self._lock = threading.Lock()
+
+    async def hit(self, key: str, count: int, period: int, cost: int = 1) -> Tuple[bool, float]:
+        """Takes `cost` tokens; returns (allowed, seconds until enough tokens refill)"""
+        rate = count / period
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (count, now))
+            tokens = min(count, tokens + (now - ts) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return True, 0.0
+            self._buckets[key] = (tokens, now)
+            return False, (cost - tokens) / rate
+
+
+class RedisRateLimiter:
+    def __init__(self, redis, fallback: Optional[LocalRateLimiter] = None):
+        self._script = redis.register_script(_TOKEN_BUCKET_SCRIPT)
+        self._fallback = fallback or LocalRateLimiter()
+
+    async def hit(self, key: str, count: int, period: int, cost: int = 1) -> Tuple[bool, float]:
+        try:
+            allowed, retry_after, _ = await self._script(
+                keys=[f"{RATE_LIMIT_PREFIX}:{key}"],
+                args=[count, count / period, cost]
+            )
+            return bool(int(allowed)), float(retry_after)
+        except RedisError as e:
+            logger.warning(f"Rate limiter falling back to local buckets: {str(e)}")
+            return await self._fallback.hit(key, count, period, cost)
+
+
+async def check_rate_limit(limiter, key: str, limit: str, cost: int = 1):
+    """Raises RateLimited when `key` is over `limit` (e.g. '30/minute')"""
+    if not RATE_LIMIT_ENABLED or limiter is None:
+        return
+    count, period = parse_limit(limit)
+    allowed, retry_after = await limiter.hit(key, count, period, cost)
+    if not allowed:
+        raise RateLimited(retry_after)
+
+
+def create_rate_limiter(redis, backend: str = RATE_LIMIT_BACKEND):
+    if backend == "redis":
+        return RedisRateLimiter(redis)
+    if backend == "local":
+        return LocalRateLimiter()
+    raise ValueError(f"Unknown rate limit backend: {backend}")
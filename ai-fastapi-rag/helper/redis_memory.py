@@ -1,51 +1,186 @@
 from datetime import datetime
+import asyncio
 import json
+import os
+import uuid
+from typing import Awaitable, Callable, List, Optional
 from redis.asyncio import Redis
+from redis.exceptions import WatchError
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def store_memory(redis: Redis, chat_id: str, question: str, answer: str):
-    """Store conversation in Redis using async methods"""
+# Turns always kept verbatim; older ones are folded into a rolling summary
+MEMORY_WINDOW = int(os.getenv("MEMORY_WINDOW", "4"))
+# Turns allowed past the window before they are folded (amortizes summarization).
+# Unfolded turns stay on the list, so prompts see up to MEMORY_WINDOW + MEMORY_FOLD_BATCH - 1
+MEMORY_FOLD_BATCH = int(os.getenv("MEMORY_FOLD_BATCH", "4"))
+MEMORY_SUMMARY_MAX_CHARS = 2000
+# One fold per chat at a time; the lock outlives a slow summary call
+MEMORY_FOLD_LOCK_SECONDS = 120
+MEMORY_PROMPT_TURN_CHARS = 500
+
+Summarizer = Callable[[str, List[dict]], Awaitable[str]]
+
+_fold_tasks = set()
+
+
+def _conversations_key(chat_id: str) -> str:
+    return f"chat:{chat_id}:conversations"
+
+
+def _summary_key(chat_id: str) -> str:
+    return f"chat:{chat_id}:memory_summary"
+
+
+def _fallback_summary(summary: str, turns: List[dict]) -> str:
+    """Keeps the tail of a plain transcript when no summarizer is available"""
+    lines = [summary] if summary else []
+    lines += [f"Q: {turn['question']} A: {turn['answer']}" for turn in turns]
+    return "\n".join(lines)[-MEMORY_SUMMARY_MAX_CHARS:]
+
+
+def _fold_lock_key(chat_id: str) -> str:
+    return f"chat:{chat_id}:memory_fold_lock"
+
+
+async def _fold_turns(redis: Redis, chat_id: str, summarize: Optional[Summarizer]):
+    """Merges the turns past MEMORY_WINDOW into the rolling summary.
+
+    The turns stay on the list until the new summary is written, and both change in
+    one MULTI, so a reader always finds every turn in the summary or on the list.
+    Only the holder of the chat's fold lock trims the list; if the lock expired and
+    another fold took it, this one gives up and leaves the turns for the next fold.
+    """
+    key = _conversations_key(chat_id)
+    lock_key = _fold_lock_key(chat_id)
+    token = uuid.uuid4().hex
+    if not await redis.set(lock_key, token, nx=True, ex=MEMORY_FOLD_LOCK_SECONDS):
+        return
     try:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.get(_summary_key(chat_id))
+            pipe.llen(key)
+            summary, length = await pipe.execute()
+        summary = summary or ""
+        count = length - MEMORY_WINDOW
+        if count <= 0:
+            return
+        turns = [json.loads(item) for item in await redis.lrange(key, 0, count - 1)]
+
+        folded = None
+        if summarize is not None:
+            try:
+                folded = (await summarize(summary, turns))[:MEMORY_SUMMARY_MAX_CHARS]
+            except Exception as e:
+                logger.error(f"Memory summarization failed, keeping transcript: {str(e)}")
+        if folded is None:
+            folded = _fallback_summary(summary, turns)
+
+        async with redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(lock_key)
+                if await pipe.get(lock_key) != token:
+                    logger.warning(f"Memory fold for chat {chat_id} outlived its lock, turns left for the next fold")
+                    return
+                pipe.multi()
+                pipe.set(_summary_key(chat_id), folded)
+                # Turns are only appended at the tail, so the first `count` are the ones summarized
+                pipe.ltrim(key, count, -1)
+                pipe.delete(lock_key)
+                await pipe.execute()
+            except WatchError:
+                logger.warning(f"Memory fold for chat {chat_id} lost its lock, turns left for the next fold")
+                return
+        logger.info(f"Folded {len(turns)} turns into memory summary for chat {chat_id}")
+    except Exception as e:
+        logger.error(f"Memory fold error: {str(e)}")
+    finally:
+        # Release unless the commit already did (or another fold holds it now)
+        try:
+            if await redis.get(lock_key) == token:
+                await redis.delete(lock_key)
+        except Exception:
+            pass
+
+
+async def store_memory(redis: Redis, chat_id: str, question: str, answer: str,
+                       summarize: Optional[Summarizer] = None):
+    """Store a conversation turn in one round trip, folding turns past the window in the background"""
+    try:
+        now = datetime.utcnow().isoformat()
         # Create conversation record
         conversation = {
             "question": question,
             "answer": answer,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": now
         }
-        
-        # Use async Redis methods
-        await redis.rpush(
-            f"chat:{chat_id}:conversations",
-            json.dumps(conversation)
-        )
-        
-        await redis.hset(
-            f"chat:{chat_id}:last",
-            mapping={
-                "question": question,
-                "answer": answer,
-                "updated_at": datetime.utcnow().isoformat()
-            }
-        )
-        
+
+        key = _conversations_key(chat_id)
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, json.dumps(conversation))
+            pipe.hset(
+                f"chat:{chat_id}:last",
+                mapping={
+                    "question": question,
+                    "answer": answer,
+                    "updated_at": now
+                }
+            )
+            length, _ = await pipe.execute()
+
+        if length - MEMORY_WINDOW >= MEMORY_FOLD_BATCH:
+            task = asyncio.create_task(_fold_turns(redis, chat_id, summarize))
+            _fold_tasks.add(task)
+            task.add_done_callback(_fold_tasks.discard)
+
         logger.info(f"Stored memory for chat {chat_id}")
         return True
-        
+
     except Exception as e:
         logger.error(f"Memory storage error: {str(e)}")
         raise
 
 async def get_memory(redis: Redis, chat_id: str, limit: int = 10):
-    """Retrieve conversation history using async methods"""
+    """Retrieve the newest conversation turns, oldest first"""
     try:
         history = await redis.lrange(
-            f"chat:{chat_id}:conversations",
-            0,
-            limit - 1
+            _conversations_key(chat_id),
+            -limit,
+            -1
         )
         return [json.loads(item) for item in history]
     except Exception as e:
         logger.error(f"Memory retrieval error: {str(e)}")
-        return []
\ No newline at end of file
+        return []
+
+async def get_memory_context(redis: Redis, chat_id: str):
+    """Rolling summary plus every turn not yet folded into it, in one round trip.
+
+    Read in one MULTI, so a fold committing meanwhile is seen entirely or not at all.
+    """
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.get(_summary_key(chat_id))
+            pipe.lrange(_conversations_key(chat_id), 0, -1)
+            summary, history = await pipe.execute()
+        return {
+            "summary": summary or "",
+            "turns": [json.loads(item) for item in history]
+        }
+    except Exception as e:
+        logger.error(f"Memory retrieval error: {str(e)}")
+        return {"summary": "", "turns": []}
+
+def format_memory(memory):
+    """Renders memory for the prompt: the summary and every unfolded turn, each turn capped in size.
+
+    Turns are only dropped from the list once they're in the summary, so rendering all
+    of them (at most MEMORY_WINDOW + MEMORY_FOLD_BATCH - 1) leaves no turn out.
+    """
+    parts = []
+    if memory["summary"]:
+        parts.append(f"Earlier conversation: {memory['summary']}")
+    for turn in memory["turns"]:
+        parts.append(f"Q: {turn['question'][:MEMORY_PROMPT_TURN_CHARS]}\nA: {turn['answer'][:MEMORY_PROMPT_TURN_CHARS]}")
+    return "\n".join(parts)
@@ -0,0 +1,72 @@
+"""Single-flight: concurrent identical reads share one in-flight computation.
+
+The first caller for a key starts the work as its own task; callers arriving while
+it runs await the same task instead of repeating the Mongo/Redis/model calls.
+Nothing is cached once the work finishes, so results are never staler than the
+request itself. A caller that is cancelled (client disconnect) only stops waiting;
+the work is cancelled when the last waiter leaves.
+"""
+from typing import Awaitable, Callable, Dict, Hashable
+import asyncio
+
+from helper.metrics import events_total, register_gauges
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+        register_gauges(self.stats)
+
+    def stats(self) -> Dict[str, float]:
+        return {f"rag_singleflight_{self.name}_inflight": len(self._flights)}
+
+    async def run(self, key: Hashable, work: Callable[[], Awaitable]):
+        """Returns work()'s result, sharing it with concurrent callers using the same key.
+
+        Callers share the result object, so they must not mutate it.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(work()))
+            flight.task.add_done_callback(lambda task: self._finish(key, flight))
+            events_total.inc(event="singleflight_leader", flight=self.name)
+        else:
+            events_total.inc(event="singleflight_coalesced", flight=self.name)
+
+        flight.waiters += 1
+        try:
+            # shield: one caller's cancellation must not cancel the others' result
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # Everyone waiting went away: stop the work and let the next caller start fresh
+                flight.task.cancel()
+                self._finish(key, flight)
+                events_total.inc(event="singleflight_cancelled", flight=self.name)
+
+    def _finish(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if flight.task.done() and not flight.task.cancelled():
+            # Mark the exception retrieved even if every waiter left first
+            flight.task.exception()
+
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive key for a question"""
+    return " ".join(question.lower().split())
+
+
+# /ask: question embeddings (pure function of the text) and retrievals per chat document set
+embedding_flight = SingleFlight("embedding")
+retrieval_flight = SingleFlight("retrieval")
+# Chat listing and summary reads
+chat_read_flight = SingleFlight("chat_read")
@@ -0,0 +1,144 @@
+"""Server-sent events for /ask: event framing, token coalescing and disconnect handling."""
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Callable, Optional
+
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+# A frame goes out once this much time has passed since the last one, or this many characters are buffered
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL_MS", "50")) / 1000
+STREAM_FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "256"))
+
+# Keep proxies (nginx) from buffering the stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+_END = object()
+
+
+def sse_event(event_type: str, **fields) -> str:
+    """One SSE event whose data is the JSON object {"type": event_type, **fields}"""
+    data = json.dumps({"type": event_type, **fields})
+    return f"event: {event_type}\ndata: {data}\n\n"
+
+
+async def coalesce(source: AsyncIterator[str], interval: float = STREAM_FLUSH_INTERVAL,
+                   max_chars: int = STREAM_FLUSH_CHARS) -> AsyncIterator[str]:
+    """Joins streamed text pieces into frames.
+
+    The first piece is sent at once so time-to-first-token is unchanged; later pieces
+    are buffered until `interval` has passed since the last frame or `max_chars` are
+    waiting. Buffered text is flushed on time even while the source is stalled.
+    """
+    iterator = source.__aiter__()
+    buffer = []
+    size = 0
+    last_flush: Optional[float] = None
+    # The pending __anext__ runs in its own task and survives a flush timeout:
+    # wait_for would cancel it, and cancelling a generator's __anext__ ends the generator
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = max(0.0, last_flush + interval - time.perf_counter()) if buffer else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                yield "".join(buffer)
+                buffer, size, last_flush = [], 0, time.perf_counter()
+                continue
+            next_piece, pending = pending, None
+            try:
+                text = next_piece.result()
+            except StopAsyncIteration:
+                break
+            buffer.append(text)
+            size += len(text)
+            now = time.perf_counter()
+            if last_flush is None or size >= max_chars or now - last_flush >= interval:
+                yield "".join(buffer)
+                buffer, size, last_flush = [], 0, now
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+    if buffer:
+        yield "".join(buffer)
+
+
+class ReleasingStreamingResponse(StreamingResponse):
+    """StreamingResponse that calls release() when the response is finished with, however it ends.
+
+    A body generator's finally only runs once iteration has started, and a background
+    task only after a successful send, so neither covers a send that fails first.
+    """
+
+    def __init__(self, content, release: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
+
+
+class DisconnectGuard:
+    """Relays an async iterator until it ends or the HTTP client goes away.
+
+    The source is consumed in its own task while another task waits for
+    http.disconnect, so a disconnect cancels the source immediately (closing e.g. the
+    upstream LLM stream) instead of at the next write. Check `disconnected` after
+    iterating to tell a finished stream from an abandoned one.
+    """
+
+    def __init__(self, request: Request):
+        self.request = request
+        self.disconnected = False
+
+    async def _wait_for_disconnect(self):
+        while True:
+            message = await self.request.receive()
+            if message["type"] == "http.disconnect":
+                return
+
+    async def relay(self, source: AsyncIterator[str]) -> AsyncIterator[str]:
+        queue = asyncio.Queue()
+
+        async def pump():
+            try:
+                async for item in source:
+                    queue.put_nowait((item, None))
+                queue.put_nowait((_END, None))
+            except Exception as e:
+                queue.put_nowait((_END, e))
+
+        pump_task = asyncio.create_task(pump())
+        watcher = asyncio.create_task(self._wait_for_disconnect())
+        try:
+            while True:
+                if watcher.done():
+                    self.disconnected = True
+                    return
+                if not queue.empty():
+                    item, error = queue.get_nowait()
+                else:
+                    getter = asyncio.ensure_future(queue.get())
+                    await asyncio.wait({getter, watcher}, return_when=asyncio.FIRST_COMPLETED)
+                    if not getter.done():
+                        getter.cancel()
+                        self.disconnected = True
+                        return
+                    item, error = getter.result()
+                if error is not None:
+                    raise error
+                if item is _END:
+                    return
+                yield item
+        finally:
+            pump_task.cancel()
+            watcher.cancel()
+            await asyncio.gather(pump_task, watcher, return_exceptions=True)
@@ -0,0 +1,65 @@
+"""Standalone ingestion worker.
+
+Runs /process jobs from the Redis queue outside the API processes, so ingestion
+can be scaled separately. API processes don't run jobs themselves with the Redis
+queue (INGEST_WORKERS defaults to 0), so run alongside them:
+
+    python ingest_worker.py --workers 2
+
+Jobs name the upload by its path in the API's temp/ directory, so every worker must
+see the same temp/ as every API node: run the workers on the API's node, or mount
+temp/ from shared storage when there are several API nodes. A job interrupted by
+shutdown is queued again with its upload kept.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from dotenv import load_dotenv
+from redis import asyncio as aioredis
+from llm.client import create_llm_client
+from helper.ingestion_queue import create_job_queue, run_worker
+from processors.ingest import run_ingestion
+from processors.file_processor import shutdown_pdf_pool
+from rag.embedder import warm_up_embedding_function, close_embedding_functions
+
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+
+async def main(workers: int):
+    redis = aioredis.from_url(
+        "redis://localhost",
+        decode_responses=True,
+        encoding="utf-8",
+        socket_timeout=5
+    )
+    llm_client = create_llm_client()
+    job_queue = create_job_queue(redis, "redis")
+
+    async def ingest_job(job, progress):
+        return await run_ingestion(job, progress, llm_client, redis)
+
+    await warm_up_embedding_function()
+    logger.info(f"Ingestion worker started with {workers} workers")
+    try:
+        await asyncio.gather(*(run_worker(job_queue, ingest_job) for _ in range(workers)))
+    finally:
+        await close_embedding_functions()
+        await asyncio.to_thread(shutdown_pdf_pool)
+        await llm_client.close()
+        await redis.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run ingestion jobs queued by /process")
+    parser.add_argument("--workers", type=int, default=1, help="concurrent jobs")
+    args = parser.parse_args()
+    asyncio.run(main(args.workers))
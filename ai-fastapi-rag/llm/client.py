@@ -0,0 +1,135 @@
+from abc import ABC, abstractmethod
+import asyncio
+import json
+import logging
+import os
+from typing import AsyncIterator, Dict, List
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "mistralai/Mistral-7B-Instruct-v0.1"
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "together")  # "together" or "fake"
+TOGETHER_BASE_URL = os.getenv("TOGETHER_BASE_URL", "https://api.together.xyz/v1")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMClient(ABC):
+    """Async chat completion client"""
+
+    @abstractmethod
+    async def complete(self, messages: List[Dict], model: str = DEFAULT_MODEL, **params) -> str:
+        """Returns the full completion text"""
+
+    @abstractmethod
+    def stream(self, messages: List[Dict], model: str = DEFAULT_MODEL, **params) -> AsyncIterator[str]:
+        """Yields completion text deltas as they arrive"""
+
+    async def close(self):
+        pass
+
+
+class TogetherLLMClient(LLMClient):
+    """Together's OpenAI-compatible API over one pooled HTTP/1.1 keep-alive client"""
+
+    def __init__(self, api_key: str, base_url: str = TOGETHER_BASE_URL,
+                 max_connections: int = LLM_MAX_CONNECTIONS, timeout: float = LLM_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.max_retries = max_retries
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {api_key}"},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout, connect=10)
+        )
+
+    async def _post_with_retries(self, payload: Dict) -> Dict:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._http.post("/chat/completions", json=payload)
+                if response.status_code not in _RETRY_STATUS or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response.json()
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"LLM request failed, retrying: {str(e)}")
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def complete(self, messages, model=DEFAULT_MODEL, **params):
+        data = await self._post_with_retries({"model": model, "messages": messages, **params})
+        return data["choices"][0]["message"]["content"]
+
+    async def stream(self, messages, model=DEFAULT_MODEL, **params):
+        """Retried like complete() until the first delta is yielded; after that the
+        client has part of the answer, so errors are raised instead"""
+        payload = {"model": model, "messages": messages, "stream": True, **params}
+        for attempt in range(self.max_retries + 1):
+            yielded = False
+            try:
+                async with self._http.stream("POST", "/chat/completions", json=payload) as response:
+                    if response.status_code not in _RETRY_STATUS or attempt == self.max_retries:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            chunk = json.loads(data)
+                            if chunk.get("choices"):
+                                text = chunk["choices"][0].get("delta", {}).get("content") or ""
+                                if text:
+                                    yielded = True
+                                    yield text
+                        return
+            except httpx.TransportError as e:
+                if yielded or attempt == self.max_retries:
+                    raise
+                logger.warning(f"LLM stream failed before its first token, retrying: {str(e)}")
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def close(self):
+        await self._http.aclose()
+
+
+class FakeLLMClient(LLMClient):
+    """Deterministic local provider for tests and benchmarks.
+
+    Answers by echoing the last user message's first words at tokens_per_second.
+    """
+
+    def __init__(self, tokens_per_second: float = 50, answer_tokens: int = 40, first_token_delay: float = 0.0):
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.first_token_delay = first_token_delay
+
+    def _tokens(self, messages):
+        words = (messages[-1]["content"] if messages else "").split() or ["ok"]
+        return [words[i % len(words)] + " " for i in range(self.answer_tokens)]
+
+    async def complete(self, messages, model=DEFAULT_MODEL, **params):
+        return "".join([token async for token in self.stream(messages, model, **params)]).strip()
+
+    async def stream(self, messages, model=DEFAULT_MODEL, **params):
+        await asyncio.sleep(self.first_token_delay)
+        delay = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        for token in self._tokens(messages):
+            await asyncio.sleep(delay)
+            yield token
+
+
+def create_llm_client(provider: str = LLM_PROVIDER) -> LLMClient:
+    if provider == "together":
+        return TogetherLLMClient(api_key=os.getenv("TOGETHER_API_KEY"))
+    if provider == "fake":
+        return FakeLLMClient(
+            tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50")),
+            first_token_delay=float(os.getenv("FAKE_LLM_FIRST_TOKEN_DELAY", "0"))
+        )
+    raise ValueError(f"Unknown LLM provider: {provider}")
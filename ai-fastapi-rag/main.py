@@ -1,39 +1,49 @@
 import os
 import logging
-from fastapi import FastAPI, UploadFile, File, Form, Request, HTTPException, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, UploadFile, File, Form, Request, Response, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
-from processors.file_processor import extract_text
-from rag.embedder import get_embedding_function
-from rag.retriever import store_documents, retrieve_similar_docs
+from processors.ingest import run_ingestion
+from processors.file_processor import shutdown_pdf_pool
+from processors.upload import receive_upload
+from rag.embedder import aget_embedding_function, warm_up_embedding_function, close_embedding_functions
+from rag.retriever import retrieve_similar_docs
+from rag.context import assemble_context, get_tokenizer
+from rag.matrix_cache import matrix_cache
 from fastapi.middleware.cors import CORSMiddleware
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from auth.auth import router as auth_router, SECRET_KEY, ALGORITHM
-from db.mongo import users_collection, chats_collection
+from auth.token_cache import token_cache
+from db.mongo import client as mongo_client, users_collection, ensure_indexes
 from jose import jwt, JWTError
-from helper.chatscollection import create_chat
-from helper.redis_memory import store_memory, get_memory
+from helper.chatscollection import create_chat, chat_exists, list_chats_page
+from helper.redis_memory import store_memory, get_memory_context, format_memory
+from helper.singleflight import embedding_flight, retrieval_flight, chat_read_flight, normalize_question
+from helper.answer_cache import get_doc_version, lookup_answer, store_answer, memory_fingerprint
+from helper.ingestion_queue import create_job_queue, run_worker, STAGES, INGEST_QUEUE
+from helper.streaming import sse_event, coalesce, DisconnectGuard, ReleasingStreamingResponse, SSE_HEADERS
+from helper.admission import llm_admission, Overloaded, INTERACTIVE, BACKGROUND, LLM_ADMISSION_MAX_WAIT
+from helper.rate_limit import create_rate_limiter, check_rate_limit, RateLimited
+from helper.metrics import (
+    timer, observe_stage, events_total, http_request_seconds, register_gauges, prompt_tokens,
+    render_metrics, should_profile, sampled_profile
+)
 from redis import asyncio as aioredis
 import json
-from together import Together
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from llm.client import create_llm_client
 from pydantic import BaseModel, constr, validator
 from fastapi import status
-from fastapi.middleware import Middleware
 from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
 from fastapi import BackgroundTasks
 from redis.exceptions import RedisError
-from pymongo.errors import PyMongoError
-import logging
-from langchain_huggingface import HuggingFaceEmbeddings  # New import path
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-# Configure logging
+# Configure logging (LOG_LEVEL=DEBUG shows prompts, chunks and answers)
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.FileHandler("app.log"),
@@ -48,20 +58,44 @@ load_dotenv()
 # Constants
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 ALLOWED_FILE_TYPES = ['.pdf', '.docx', '.txt', '.pptx']
-TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
-
-# Initialize Redis for rate limiting and memory
-redis = aioredis.from_url(
-    "redis://localhost",
-    decode_responses=True,  # Correct parameter name
-    encoding="utf-8",
-    socket_timeout=5
-)
-# Initialize Together client with async support
-client = Together(api_key=TOGETHER_API_KEY, timeout=30, max_retries=3)
 
-# Rate limiter
-limiter = Limiter(key_func=get_remote_address)
+# Redis (memory, caches, job queue), the pooled LLM client and the ingestion queue
+# are created once per worker in lifespan()
+redis = None
+llm_client = None
+job_queue = None
+rate_limiter = None
+
+# Per-user request limits, shared by all workers through Redis
+ASK_RATE_LIMIT = os.getenv("ASK_RATE_LIMIT", "30/minute")
+
+# In-process ingestion workers. Jobs point at the upload in this node's temp/, so with the
+# shared Redis queue they're run by ingest_worker.py on a node that shares temp/ with the
+# API (one node, or shared storage) rather than by any API process; see ingest_worker.py
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1" if INGEST_QUEUE == "local" else "0"))
+ingest_tasks = []
+warm_up_task = None
+# Flipped by warm_up() once indexes exist and the embedding model has run once
+readiness = {"model_warm": False}
+READINESS_TIMEOUT = 2
+
+async def summarize_memory(summary, turns):
+    """Folds old conversation turns into the chat's rolling memory summary"""
+    transcript = "\n".join(f"Q: {turn['question']}\nA: {turn['answer']}" for turn in turns)
+    prompt = f"""Update the conversation summary with the new turns. Keep it under 150 words.
+
+Current summary:
+{summary or "(none)"}
+
+New turns:
+{transcript}
+
+Updated summary:"""
+    async with llm_admission.slot(BACKGROUND, "memory"):
+        return (await llm_client.complete([{"role": "user", "content": prompt}])).strip()
+
+async def ingest_job(job, progress):
+    return await run_ingestion(job, progress, llm_client, redis)
 
 # Pydantic models for input validation
 class ChatCreateRequest(BaseModel):
@@ -81,51 +115,158 @@ class AskRequest(BaseModel):
     chat_id: constr(min_length=24, max_length=24)
     question: constr(min_length=1, max_length=1000)
 
-app = FastAPI()
+async def warm_up():
+    """Runs after the worker starts serving, so liveness answers during a cold start"""
+    try:
+        await ensure_indexes()
+        # Load the embedding model once per worker instead of per request
+        await warm_up_embedding_function()
+        # Prompt tokenizer for context packing (falls back to estimates if it can't load)
+        await asyncio.to_thread(get_tokenizer)
+        readiness["model_warm"] = True
+    except Exception as e:
+        logger.error(f"Warm-up failed, worker stays unready: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global redis, llm_client, job_queue, rate_limiter, warm_up_task
+    redis = aioredis.from_url(
+        "redis://localhost",
+        decode_responses=True,  # Correct parameter name
+        encoding="utf-8",
+        socket_timeout=5
+    )
+    # Async LLM client with pooled connections (LLM_PROVIDER=fake for local runs)
+    llm_client = create_llm_client()
+    job_queue = create_job_queue(redis)
+    rate_limiter = create_rate_limiter(redis)
+
+    warm_up_task = asyncio.create_task(warm_up())
+    if not INGEST_WORKERS:
+        logger.info("No in-process ingestion workers: uploads wait for ingest_worker.py")
+    for _ in range(INGEST_WORKERS):
+        ingest_tasks.append(asyncio.create_task(run_worker(job_queue, ingest_job)))
+    try:
+        yield
+    finally:
+        for task in ingest_tasks + [warm_up_task]:
+            task.cancel()
+        await asyncio.gather(warm_up_task, *ingest_tasks, return_exceptions=True)
+        ingest_tasks.clear()
+        readiness["model_warm"] = False
+        await close_embedding_functions()
+        await asyncio.to_thread(shutdown_pdf_pool)
+        await llm_client.close()
+        await redis.close()
+        mongo_client.close()
+        logger.info("Application shutdown complete")
+
+app = FastAPI(lifespan=lifespan)
 
 # Add HTTPS redirection in production
 if os.getenv("ENVIRONMENT") == "production":
     app.add_middleware(HTTPSRedirectMiddleware)
 
+register_gauges(lambda: {f"rag_embedding_matrix_cache_{k}": v for k, v in matrix_cache.stats().items()})
+register_gauges(lambda: {f"rag_auth_token_cache_{k}": v for k, v in token_cache.stats().items()})
+
+# Request latency per route, plus cProfile on a sample of requests (PROFILE_SAMPLE_RATE)
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        if should_profile():
+            with sampled_profile(request.url.path):
+                response = await call_next(request)
+        else:
+            response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        http_request_seconds.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=status_code
+        )
+
 # Rate limiting exception handler
-@app.exception_handler(RateLimitExceeded)
-async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+@app.exception_handler(RateLimited)
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimited):
     return JSONResponse(
         status_code=status.HTTP_429_TOO_MANY_REQUESTS,
         content={"detail": "Too many requests. Please try again later."},
+        headers={"Retry-After": str(exc.retry_after)},
     )
 
-# Dependency for authentication
-# Update the get_current_user dependency
+# Admission control: queue full or waited too long -> 503, too many in flight for one user -> 429
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+def streamed_body(request: Request):
+    """Route dependency for routes that read their own body (receive_upload); list it first"""
+    request.state.streamed_body = True
+
+# Dependency for authentication: the Bearer header, or a "token" form field.
+# FastAPI parses Form/File parameters before any dependency runs, so the fallback reads
+# nothing new on those routes. Routes marked streamed_body only accept the header, so a
+# request without one is refused before any of its upload is read.
 async def get_current_user(request: Request):
-    # Check both headers and form data for token
-    auth_header = request.headers.get("Authorization")
-    form_data = await request.form()
-    
     token = None
+    auth_header = request.headers.get("Authorization")
     if auth_header and auth_header.startswith('Bearer '):
         token = auth_header.split(' ')[1]
-    elif "token" in form_data:
-        token = form_data["token"]
-    
+    elif not getattr(request.state, "streamed_body", False):
+        form_data = await request.form()
+        token = form_data.get("token")
+
     if not token:
         raise HTTPException(status_code=401, detail="Missing token")
-    
+
+    user = token_cache.get(token)
+    if user is not None:
+        events_total.inc(event="auth_cache_hit")
+        return user
+    events_total.inc(event="auth_cache_miss")
+
+    start = time.perf_counter()
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email = payload.get("sub")
         if not email:
             raise HTTPException(status_code=401, detail="Invalid token")
-        
+
         user = await users_collection.find_one({"email": email})
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
-        
+
+        token_cache.put(token, user, payload.get("exp"))
+        observe_stage("auth", time.perf_counter() - start)
         return user
     except JWTError as e:
         logger.error(f"JWT Error: {str(e)}")
         raise HTTPException(status_code=401, detail="Invalid token")
 
+def rate_limit(scope: str, limit: str, by: str = "user"):
+    """Route dependency enforcing `limit` (e.g. "10/minute") per authenticated user, or per client IP"""
+    if by == "ip":
+        async def limit_by_ip(request: Request):
+            client = request.client.host if request.client else "unknown"
+            await check_rate_limit(rate_limiter, f"{scope}:ip:{client}", limit)
+        return Depends(limit_by_ip)
+
+    # get_current_user is cached per request, so the route's own dependency doesn't re-verify
+    async def limit_by_user(current_user: dict = Depends(get_current_user)):
+        await check_rate_limit(rate_limiter, f"{scope}:user:{current_user['email']}", limit)
+    return Depends(limit_by_user)
+
 # Update CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -135,13 +276,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Helper function for file validation
-async def validate_file_size(file: UploadFile):
-    if file.size > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File too large. Max size is {MAX_FILE_SIZE/1024/1024}MB"
-        )
+# Documents the multipart body of routes that parse it themselves with receive_upload
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file", "chat_id"],
+            "properties": {"file": {"type": "string", "format": "binary"}, "chat_id": {"type": "string"}},
+        }}},
+    }
+}
 
 # Background task for cleanup
 async def cleanup_temp_file(path: str):
@@ -151,37 +296,43 @@ async def cleanup_temp_file(path: str):
     except Exception as e:
         logger.error(f"Error cleaning up temp file {path}: {str(e)}")
 
-@app.post("/test_upload")
-@limiter.limit("5/minute")
-async def test_upload(
-    request: Request,
-    chat_id: str = Form(...),
-    file: UploadFile = File(...)
-):
+@app.post("/test_upload", dependencies=[rate_limit("test_upload", "5/minute", by="ip")],
+          openapi_extra=UPLOAD_OPENAPI)
+async def test_upload(request: Request):
+    fields, upload = await receive_upload(request, "temp", MAX_FILE_SIZE)
+    if upload:
+        await cleanup_temp_file(upload["path"])
+    if not upload or "chat_id" not in fields:
+        raise HTTPException(status_code=422, detail="file and chat_id are required")
     return {
-        "chat_id": chat_id,
-        "filename": file.filename
+        "chat_id": fields["chat_id"],
+        "filename": upload["filename"]
     }
 
-@app.get("/chats")
-@limiter.limit("10/minute")
+@app.get("/chats", dependencies=[rate_limit("chats", "10/minute")])
 async def list_chats(
     request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=100),
+    cursor: str = Query(None),
     current_user: dict = Depends(get_current_user)
 ):
+    """Newest chats first; pass the X-Next-Cursor response header back as ?cursor= for the next page"""
     try:
-        chats = await chats_collection.find({"user_id": current_user["email"]}).sort("created_at", -1).to_list(length=100)
-        return [{
-            "chat_id": chat["chat_id"],
-            "chat_name": chat["chat_name"],
-            "created_at": chat["created_at"]
-        } for chat in chats]
+        chats, next_cursor = await chat_read_flight.run(
+            ("chats", current_user["email"], limit, cursor),
+            lambda: list_chats_page(current_user["email"], limit, cursor)
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return chats
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         logger.error(f"Error listing chats: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@app.post("/chat")
-@limiter.limit("3/minute")
+@app.post("/chat", dependencies=[rate_limit("chat", "3/minute")])
 async def create_new_chat(
     request: Request,
     chat_data: ChatCreateRequest,
@@ -195,78 +346,61 @@ async def create_new_chat(
         logger.error(f"Error creating chat: {str(e)}")
         raise HTTPException(status_code=500, detail="Error creating chat")
 
-@app.post("/process")
-@limiter.limit("5/minute")
+@app.post("/process", dependencies=[Depends(streamed_body), rate_limit("process", "5/minute")],
+          openapi_extra=UPLOAD_OPENAPI)
 async def process_file(
     request: Request,
     background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
-    chat_id: str = Form(...),
     current_user: dict = Depends(get_current_user)
 ):
     try:
-        # Validate file
-        if not file.filename:
+        # The body is parsed here, after auth and rate limiting: an oversized Content-Length is
+        # refused unread, and the file streams to a unique temp file (deleted by the ingestion
+        # worker) with the size cap checked as bytes arrive
+        with timer("upload_spool"):
+            fields, upload = await receive_upload(request, "temp", MAX_FILE_SIZE, ALLOWED_FILE_TYPES)
+        if not upload:
             raise HTTPException(status_code=400, detail="No file provided")
+        temp_path, file_hash = upload["path"], upload["sha256"]
 
-        # Check file size
-        await validate_file_size(file)
-
-        # Verify chat exists
-        chat = await chats_collection.find_one({"chat_id": chat_id, "user_id": current_user["email"]})
-        if not chat:
-            raise HTTPException(status_code=404, detail="Chat not found")
-
-        # Save to temp file
-        temp_path = f"temp/{file.filename}"
-        os.makedirs("temp", exist_ok=True)
+        try:
+            chat_id = fields.get("chat_id")
+            if not chat_id:
+                raise HTTPException(status_code=422, detail="chat_id is required")
+
+            # Verify chat exists
+            with timer("chat_lookup"):
+                found = await chat_exists(current_user["email"], chat_id)
+            if not found:
+                raise HTTPException(status_code=404, detail="Chat not found")
+        except BaseException:
+            await cleanup_temp_file(temp_path)
+            raise
 
         try:
-            # Write file to disk
-            with open(temp_path, "wb") as f:
-                f.write(await file.read())
-
-            # Extract text
-            text = extract_text(temp_path)
-            if not text:
-                raise HTTPException(status_code=400, detail="Could not extract text from file")
-
-            # Split into chunks
-            splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=50)
-            chunks = splitter.split_text(text)
-            if not chunks:
-                raise HTTPException(status_code=400, detail="No valid text chunks extracted")
-
-            # Store embeddings
-            embed_fn = get_embedding_function()
-            await store_documents(chunks, embed_fn, current_user["email"], chat_id)
-
-            # Generate summary
-            summary_prompt = f"Summarize this document in 3-4 lines:\n\n{text[:5000]}"
-            completion = client.chat.completions.create(
-                model="mistralai/Mistral-7B-Instruct-v0.1",
-                messages=[{"role": "user", "content": summary_prompt}]
+            job = await job_queue.enqueue({
+                "path": temp_path,
+                "file_hash": file_hash,
+                "filename": upload["filename"],
+                "user_id": current_user["email"],
+                "chat_id": chat_id,
+            })
+            logger.info(f"Queued ingestion job {job['job_id']} for chat {chat_id}")
+
+            return JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content={
+                    "status": "queued",
+                    "message": "File accepted for processing",
+                    "filename": upload["filename"],
+                    "job_id": job["job_id"]
+                }
             )
-            summary_text = completion.choices[0].message.content.strip()
-
-            # Store summary in Redis
-            await redis.set(f"summary:{chat_id}", summary_text)
-
-            # Return success
-            return {
-                "status": "success",
-                "message": "File processed and embedded successfully",
-                "filename": file.filename,
-                "summary": summary_text
-            }
 
         except Exception as e:
-            logger.error(f"Processing failed: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
-
-        finally:
-            # Clean up temp file
+            logger.error(f"Queueing failed: {str(e)}")
             background_tasks.add_task(cleanup_temp_file, temp_path)
+            raise HTTPException(status_code=500, detail=str(e))
 
     except HTTPException as he:
         raise he
@@ -275,83 +409,164 @@ async def process_file(
         raise HTTPException(status_code=500, detail="Upload failed")
 
 
-@app.post("/ask")
+@app.get("/process/{job_id}")
+async def get_process_status(
+    request: Request,
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    job = await job_queue.get(job_id)
+    if not job or job.get("user_id") != current_user["email"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "stage": job["stage"],
+        "stages": STAGES,
+        "chunks_stored": job.get("chunks_stored", 0),
+        "filename": job.get("filename"),
+        "chat_id": job.get("chat_id"),
+        "summary": job.get("summary"),
+        "error": job.get("error"),
+        "created_at": job.get("created_at"),
+        "updated_at": job.get("updated_at")
+    }
+
+
+@app.post("/ask", dependencies=[rate_limit("ask", ASK_RATE_LIMIT)])
 async def ask_question(
     request: Request,
     question: str = Form(...),
     chat_id: str = Form(...),
     current_user: dict = Depends(get_current_user)
 ):
-    async def generate_stream(prompt: str, chat_id: str, question: str):
-        """Inner function to handle the streaming response"""
-        full_answer = ""
+    async def replay_stream(answer: str, chat_id: str, question: str):
+        """Streams a cached answer in the same format as generate_stream"""
+        yield sse_event("answer_chunk", content=answer)
         try:
-            print(f"\n---PROMPT---\n{prompt}\n---END PROMPT---\n")  # Debug prompt
+            await store_memory(redis, chat_id, question, answer, summarize_memory)
+        except Exception as e:
+            logger.error(f"Memory storage failed: {str(e)}")
+        yield sse_event("done")
 
-            # Create the completion asynchronously
-            response = client.chat.completions.create(
-                model="mistralai/Mistral-7B-Instruct-v0.1",
-                messages=[{"role": "user", "content": prompt}],
-                stream=True
-            )
-            
-            # Process the  iterator sync way
-            for chunk in response:
-                if chunk.choices:
-                    text = chunk.choices[0].delta.content or ""
-                    print(f"RAW CHUNK: {text}")  
-                    full_answer += text
-                    yield json.dumps({
-                        "type": "answer_chunk",
-                        "content": text
-                    }) + "\n"
+    async def generate_stream(prompt: str, chat_id: str, question: str, question_embedding, doc_version: int,
+                              memory_key: str, ticket):
+        """Streams the answer as coalesced SSE frames, stopping the LLM as soon as the client disconnects"""
+        answer_parts = []
+        guard = DisconnectGuard(request)
+        start = time.perf_counter()
 
-            print(f"\n---FULL ANSWER---\n{full_answer}\n---END ANSWER---\n")  # Debug final answer
-            logger.info(f"Final answer: {full_answer}")
+        def record_abandoned():
+            events_total.inc(event="ask_client_disconnect")
+            observe_stage("llm_generation_abandoned", time.perf_counter() - start)
+            logger.info(f"Client disconnected, stopped generation for chat {chat_id}")
 
+        try:
+            logger.debug("ask prompt chat_id=%s prompt=%r", chat_id, prompt)
+
+            # Stream the completion without blocking the event loop
+            first_token = True
+            tokens = guard.relay(llm_client.stream([{"role": "user", "content": prompt}]))
+            async for text in coalesce(tokens):
+                if first_token:
+                    observe_stage("llm_first_token", time.perf_counter() - start)
+                    first_token = False
+                answer_parts.append(text)
+                yield sse_event("answer_chunk", content=text)
+
+            # Nobody is listening: don't remember or cache a truncated answer
+            if guard.disconnected:
+                record_abandoned()
+                return
+            observe_stage("llm_generation", time.perf_counter() - start)
+
+            full_answer = "".join(answer_parts)
+            logger.debug("ask answer chat_id=%s answer=%r", chat_id, full_answer)
 
             # Store conversation after successful completion
             try:
-                await store_memory(redis, chat_id, question, full_answer)
+                await store_memory(redis, chat_id, question, full_answer, summarize_memory)
             except Exception as e:
                 logger.error(f"Memory storage failed: {str(e)}")
 
+            if full_answer.strip():
+                try:
+                    await store_answer(redis, chat_id, question, question_embedding, full_answer, doc_version,
+                                       memory_key)
+                except Exception as e:
+                    logger.error(f"Answer cache storage failed: {str(e)}")
+
+            yield sse_event("done")
+
+        except asyncio.CancelledError:
+            # Starlette cancels the body itself when it notices the disconnect first
+            record_abandoned()
+            raise
         except Exception as e:
             logger.error(f"Stream error: {str(e)}")
-            yield json.dumps({
-                "type": "error",
-                "content": "Error generating answer"
-            }) + "\n"
+            yield sse_event("error", content="Error generating answer")
+        finally:
+            ticket.release()
 
     try:
         logger.info(f"Ask request - User: {current_user['email']}, Chat: {chat_id}")
 
         # 1. Verify chat exists
-        chat = await chats_collection.find_one({
-            "chat_id": chat_id,
-            "user_id": current_user["email"]
-        })
-        if not chat:
+        with timer("chat_lookup"):
+            found = await chat_exists(current_user["email"], chat_id)
+        if not found:
             raise HTTPException(404, "Chat not found")
 
-        # 2. Initialize embedding function
+        # 2. Embed the question with the shared model (loaded and warmed at startup)
         try:
-            embed_fn = get_embedding_function()
-            test_embedding = embed_fn.embed_query("test")
-            if not test_embedding:
-                raise ValueError("Embedding failed")
+            embed_fn = await aget_embedding_function()
+            # Identical questions in flight at the same time share one embedding
+            with timer("embed_query"):
+                question_embedding = await embedding_flight.run(
+                    normalize_question(question), lambda: embed_fn.aembed_query(question)
+                )
+        except Overloaded:
+            raise
         except Exception as e:
             logger.error(f"Embedding error: {str(e)}")
             raise HTTPException(500, "Embedding service unavailable")
 
-        # 3. Retrieve documents
+        # 3. Answer near-identical questions asked with the same documents and conversation memory
+        # from the cache (memory is bounded, see format_memory, and also goes into the prompt)
+        memory = format_memory(await get_memory_context(redis, chat_id))
+        memory_key = memory_fingerprint(memory)
+        doc_version = 0
         try:
-            results = await retrieve_similar_docs(
-                question,
-                embed_fn,
-                current_user["email"],
-                chat_id
-            )
+            doc_version = await get_doc_version(redis, chat_id)
+            with timer("answer_cache_lookup"):
+                cached = await lookup_answer(redis, chat_id, question_embedding, doc_version, memory_key)
+            events_total.inc(event="answer_cache_hit" if cached else "answer_cache_miss")
+            if cached:
+                logger.info(f"Answer cache hit for chat {chat_id} (similarity {cached['similarity']:.3f})")
+                return StreamingResponse(
+                    replay_stream(cached["answer"], chat_id, question),
+                    media_type="text/event-stream",
+                    headers=SSE_HEADERS
+                )
+        except RedisError as e:
+            logger.error(f"Answer cache lookup failed: {str(e)}")
+
+        # 4. Retrieve documents
+        try:
+            # ...and one retrieval per chat document set (doc_version changes on upload)
+            with timer("retrieval"):
+                results = await retrieval_flight.run(
+                    (chat_id, doc_version, normalize_question(question)),
+                    lambda: retrieve_similar_docs(
+                        question,
+                        embed_fn,
+                        current_user["email"],
+                        chat_id,
+                        question_embedding=question_embedding,
+                        # Matrix caches built before another worker's upload are discarded
+                        doc_version=doc_version
+                    )
+                )
             
             if not results["documents"]:
                 return {
@@ -360,7 +575,10 @@ async def ask_question(
                     "answer": "I couldn't find any information to answer your question."
                 }
 
-            context = "\n\n".join(results["documents"][:3])
+            # Merged, de-duplicated and packed into CONTEXT_TOKEN_BUDGET tokens
+            with timer("context_assembly"):
+                context, context_tokens = assemble_context(results["documents"], results.get("scores"))
+            prompt_tokens.observe(context_tokens, kind="context")
 
         except HTTPException:
             raise
@@ -368,10 +586,14 @@ async def ask_question(
             logger.error(f"Document error: {str(e)}")
             raise HTTPException(500, "Document processing failed")
 
-        # 4. Generate response
+        # 5. Generate response, with the conversation memory for follow-ups
+        history = f"""
+        Conversation so far:
+        {memory}
+        """ if memory else ""
         prompt = f"""Answer based on:
         {context}
-        
+        {history}
         Question: {question}
         
         Rules:
@@ -380,44 +602,83 @@ async def ask_question(
         - Say "I don't know" if unsure
         Answer:"""
 
-        return StreamingResponse(
-            generate_stream(prompt, chat_id, question),
-            media_type="text/event-stream"
-        )
+        # Interactive LLM slot, held until the stream ends (background summaries queue behind it).
+        # Taken before the response so Overloaded is still a 503; released here if the response
+        # can't be built, and otherwise by the response when it's done, even if it never started
+        ticket = await llm_admission.acquire(INTERACTIVE, current_user["email"], LLM_ADMISSION_MAX_WAIT)
+        try:
+            return ReleasingStreamingResponse(
+                generate_stream(prompt, chat_id, question, question_embedding, doc_version, memory_key, ticket),
+                release=ticket.release,
+                media_type="text/event-stream",
+                headers=SSE_HEADERS
+            )
+        except BaseException:
+            ticket.release()
+            raise
 
-    except HTTPException:
+    except (HTTPException, Overloaded):
         raise
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         raise HTTPException(500, "Processing failed")
     
 
-@app.get("/chat_summary/{chat_id}")
-@limiter.limit("20/minute")
+@app.get("/chat_summary/{chat_id}", dependencies=[rate_limit("chat_summary", "20/minute")])
 async def get_chat_summary(
     request: Request,
     chat_id: str,
     current_user: dict = Depends(get_current_user)
 ):
     try:
+        async def read_summary():
+            with timer("chat_lookup"):
+                found = await chat_exists(current_user["email"], chat_id)
+            return found, (await redis.get(f"summary:{chat_id}") if found else None)
+
         # Validate chat exists
-        chat = await chats_collection.find_one({
-            "chat_id": chat_id,
-            "user_id": current_user["email"]
-        })
-        if not chat:
+        found, summary = await chat_read_flight.run(
+            ("chat_summary", current_user["email"], chat_id), read_summary
+        )
+        if not found:
             raise HTTPException(status_code=404, detail="Chat not found")
 
-        summary = await redis.get(f"summary:{chat_id}")
         return {"summary": summary or "No summary available."}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting chat summary: {str(e)}")
         raise HTTPException(status_code=500, detail="Error retrieving summary")
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    await redis.close()
-    logger.info("Application shutdown complete")
+@app.get("/cache_stats")
+async def cache_stats(current_user: dict = Depends(get_current_user)):
+    return {"embedding_matrix": matrix_cache.stats()}
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/live")
+async def liveness():
+    """The process is up and serving; says nothing about dependencies"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Ready once the model is warm and Redis and Mongo answer; 503 until then"""
+    checks = {"model_warm": readiness["model_warm"]}
+    for name, ping in (("redis", redis.ping), ("mongo", lambda: mongo_client.admin.command("ping"))):
+        try:
+            await asyncio.wait_for(ping(), READINESS_TIMEOUT)
+            checks[name] = True
+        except Exception as e:
+            logger.warning(f"Readiness check {name} failed: {str(e)}")
+            checks[name] = False
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if ready else "starting", "checks": checks}
+    )
 
 # Include auth router
 app.include_router(auth_router, prefix="/auth")
\ No newline at end of file
@@ -1,30 +1,185 @@
-from PyPDF2 import PdfReader
-from docx import Document
+from concurrent.futures import ProcessPoolExecutor
+import concurrent.futures
+import multiprocessing
+import threading
+import asyncio
+import os
 
-def extract_text(file_path):
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "0")) or (os.cpu_count() or 1)
+PDF_PAGES_PER_TASK = 8
+# Smaller PDFs aren't worth the process pool overhead
+PDF_PARALLEL_MIN_PAGES = 32
+TXT_BLOCK_SIZE = 64 * 1024
+# How much extracted text to buffer before splitting it into chunks
+STREAM_BUFFER_CHARS = 16 * 1024
+
+_pdf_pool = None
+# Extraction runs in executor threads, so two large PDFs can ask for the pool at once
+_pdf_pool_lock = threading.Lock()
+
+
+def _get_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # spawn: a forked worker would inherit the server's event loop, sockets and threads
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _pdf_pool
+
+
+def shutdown_pdf_pool():
+    """Stops the PDF extraction processes, if any were started (call at shutdown)"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        pool, _pdf_pool = _pdf_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _extract_pdf_pages(file_path, start, stop):
+    from PyPDF2 import PdfReader
+    reader = PdfReader(file_path)
+    return [(reader.pages[i].extract_text() or '') for i in range(start, stop)]
+
+
+def _iter_pdf(file_path, parallel=True):
+    from PyPDF2 import PdfReader
+    reader = PdfReader(file_path)
+    page_count = len(reader.pages)
+    if not parallel or PDF_EXTRACT_WORKERS < 2 or page_count < PDF_PARALLEL_MIN_PAGES:
+        for page in reader.pages:
+            yield page.extract_text() or ''
+        return
+
+    # Each task opens its own reader and extracts a page range; map keeps page order
+    starts = list(range(0, page_count, PDF_PAGES_PER_TASK))
+    stops = [min(start + PDF_PAGES_PER_TASK, page_count) for start in starts]
+    results = _get_pdf_pool().map(_extract_pdf_pages, [file_path] * len(starts), starts, stops)
+    for pages in results:
+        yield from pages
+
+
+def _iter_docx(file_path):
+    from docx import Document
+    doc = Document(file_path)
+    for para in doc.paragraphs:
+        yield para.text
+
+
+def _iter_pptx(file_path):
+    from pptx import Presentation
+    presentation = Presentation(file_path)
+    for slide in presentation.slides:
+        texts = [shape.text_frame.text for shape in slide.shapes if shape.has_text_frame]
+        yield '\n'.join(text for text in texts if text)
+
+
+def _iter_txt(file_path):
+    with open(file_path, 'r', encoding='utf-8') as file:
+        while True:
+            block = file.read(TXT_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+
+
+def iter_text(file_path, parallel=True):
     """
-    Extracts text from a PDF or DOCX file.
-    
+    Yields the text of a PDF, DOCX, PPTX or TXT file one unit at a time
+    (page, paragraph, slide or block).
+
     Args:
         file_path (str): The path to the file.
-        
-    Returns:
-        str: The extracted text.
+        parallel (bool): Extract large PDFs across a process pool.
+
+    Yields:
+        str: The text of the next unit.
     """
     if file_path.endswith('.pdf'):
-        reader = PdfReader(file_path)
-        text = ''
-        for page in reader.pages:
-            text += page.extract_text() + '\n'
-        return text.strip()
+        yield from _iter_pdf(file_path, parallel)
     elif file_path.endswith('.docx'):
-        doc = Document(file_path)
-        text = ''
-        for para in doc.paragraphs:
-            text += para.text + '\n'
-        return text.strip()
+        yield from _iter_docx(file_path)
+    elif file_path.endswith('.pptx'):
+        yield from _iter_pptx(file_path)
     elif file_path.endswith('.txt'):
-        with open(file_path,r,encoding='utf-8') as file:
-            return file.read().strip()
+        yield from _iter_txt(file_path)
     else:
-        raise ValueError("Unsupported file format. Only PDF, DOCX, and TXT files are supported.")
\ No newline at end of file
+        raise ValueError("Unsupported file format. Only PDF, DOCX, PPTX and TXT files are supported.")
+
+
+def extract_text(file_path):
+    """
+    Extracts text from a PDF, DOCX, PPTX or TXT file.
+
+    Args:
+        file_path (str): The path to the file.
+
+    Returns:
+        str: The extracted text.
+    """
+    separator = '' if file_path.endswith('.txt') else '\n'
+    return separator.join(iter_text(file_path)).strip()
+
+
+async def aiter_text(file_path):
+    """Runs iter_text on a thread and yields its units without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=64)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while not stop.is_set():
+            try:
+                return future.result(timeout=0.1)
+            except concurrent.futures.TimeoutError:
+                continue
+        future.cancel()
+
+    def produce():
+        try:
+            for unit in iter_text(file_path):
+                if stop.is_set():
+                    return
+                put(unit)
+        except Exception as e:
+            put(e)
+        else:
+            put(done)
+
+    loop.run_in_executor(None, produce)
+    try:
+        while True:
+            unit = await queue.get()
+            if unit is done:
+                break
+            if isinstance(unit, Exception):
+                raise unit
+            yield unit
+    finally:
+        # Lets the producer thread exit if the consumer stops early
+        stop.set()
+
+
+async def stream_chunks(file_path, splitter, buffer_chars=STREAM_BUFFER_CHARS):
+    """
+    Splits a file into chunks while it is still being extracted.
+
+    Yields:
+        tuple: (list of new chunks, the unit of text that was just extracted)
+    """
+    separator = '' if file_path.endswith('.txt') else '\n'
+    buffer = ''
+    async for unit in aiter_text(file_path):
+        buffer += unit + separator
+        if len(buffer) < buffer_chars:
+            yield [], unit
+            continue
+        chunks = splitter.split_text(buffer)
+        # Keep the last chunk so text that continues in the next unit splits cleanly
+        buffer = chunks[-1] if chunks else ''
+        yield chunks[:-1], unit
+    if buffer.strip():
+        yield splitter.split_text(buffer), ''
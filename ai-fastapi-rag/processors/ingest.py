@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+import time
+from processors.file_processor import stream_chunks
+from rag.embedder import aget_embedding_function
+from rag.retriever import store_documents
+from rag.content_cache import get_file_entry, put_file_entry
+from rag.context import SUMMARY_TOKEN_BUDGET, truncate_to_tokens, count_tokens
+from helper.answer_cache import bump_doc_version
+from helper.metrics import timer, observe_stage, prompt_tokens
+from helper.admission import llm_admission, BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MODEL = "mistralai/Mistral-7B-Instruct-v0.1"
+# Text kept for the summary while extracting; trimmed to SUMMARY_TOKEN_BUDGET tokens afterwards
+SUMMARY_SOURCE_CHARS = SUMMARY_TOKEN_BUDGET * 8
+EMBED_BATCH_CHUNKS = 128  # chunks embedded and stored per batch during upload
+
+
+def _summary_source(text):
+    """The start of the document that fits SUMMARY_TOKEN_BUDGET, and its token count"""
+    source = truncate_to_tokens(text, SUMMARY_TOKEN_BUDGET)
+    return source, count_tokens([source])[0]
+
+
+async def run_ingestion(job, progress, llm_client, redis):
+    """
+    Extracts, splits, embeds and summarizes one uploaded file.
+
+    Args:
+        job (dict): Ingestion job with path, user_id, chat_id and optionally file_hash.
+        progress: Coroutine called as progress(stage, **fields) between stages.
+        llm_client (LLMClient): Client used for the summary.
+        redis: Redis client the summary is stored in.
+
+    Returns:
+        dict: The summary and the number of chunks stored.
+    """
+    temp_path = job["path"]
+    user_id = job["user_id"]
+    chat_id = job["chat_id"]
+    file_hash = job.get("file_hash")
+    start = time.perf_counter()
+    keep_upload = False
+    try:
+        embed_fn = await aget_embedding_function()
+
+        # Same bytes ingested before: reuse its chunks (and their cached embeddings) and summary
+        entry = await get_file_entry(file_hash) if file_hash else None
+        if entry:
+            await progress("embedding")
+            chunks = entry["chunks"]
+            stored = 0
+            for offset in range(0, len(chunks), EMBED_BATCH_CHUNKS):
+                stored += await store_documents(chunks[offset:offset + EMBED_BATCH_CHUNKS], embed_fn, user_id, chat_id)
+                await progress("embedding", chunks_stored=min(offset + EMBED_BATCH_CHUNKS, len(chunks)))
+            if stored:
+                await bump_doc_version(redis, chat_id)
+            await redis.set(f"summary:{chat_id}", entry["summary"])
+            observe_stage("ingest_total", time.perf_counter() - start, cached=True)
+            return {"summary": entry["summary"], "chunks_stored": len(chunks), "cached": True}
+
+        # Extract, split and embed as pages come in
+        await progress("extracting")
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=50)
+        summary_units = []
+        summary_chars = 0
+        all_chunks = []
+        pending = []
+        chunk_count = 0
+        stored = 0
+        async for chunks, unit in stream_chunks(temp_path, splitter):
+            if summary_chars < SUMMARY_SOURCE_CHARS:
+                summary_units.append(unit)
+                summary_chars += len(unit) + 1
+            pending.extend(chunks)
+            if file_hash:
+                all_chunks.extend(chunks)
+            if len(pending) >= EMBED_BATCH_CHUNKS:
+                stored += await store_documents(pending, embed_fn, user_id, chat_id)
+                chunk_count += len(pending)
+                pending = []
+                await progress("embedding", chunks_stored=chunk_count)
+        if pending:
+            stored += await store_documents(pending, embed_fn, user_id, chat_id)
+            chunk_count += len(pending)
+        if stored:
+            # Cached answers were based on the old document set
+            await bump_doc_version(redis, chat_id)
+
+        text = "\n".join(summary_units).strip()
+        if not text:
+            raise ValueError("Could not extract text from file")
+        if not chunk_count:
+            raise ValueError("No valid text chunks extracted")
+
+        observe_stage("ingest_extract_embed", time.perf_counter() - start)
+
+        # Generate summary
+        await progress("summarizing", chunks_stored=chunk_count)
+        source, source_tokens = await asyncio.to_thread(_summary_source, text)
+        prompt_tokens.observe(source_tokens, kind="summary")
+        summary_prompt = f"Summarize this document in 3-4 lines:\n\n{source}"
+        # Background priority: interactive /ask calls are admitted first
+        async with llm_admission.slot(BACKGROUND, user_id):
+            with timer("ingest_summary"):
+                completion = await llm_client.complete(
+                    [{"role": "user", "content": summary_prompt}],
+                    model=SUMMARY_MODEL
+                )
+        summary_text = completion.strip()
+
+        # Store summary in Redis
+        await redis.set(f"summary:{chat_id}", summary_text)
+        if file_hash:
+            await put_file_entry(file_hash, all_chunks, summary_text)
+
+        observe_stage("ingest_total", time.perf_counter() - start, cached=False)
+        return {"summary": summary_text, "chunks_stored": chunk_count, "cached": False}
+
+    except asyncio.CancelledError:
+        # Shutdown: the job is queued again (see run_worker) and will need the file
+        keep_upload = job.get("requeue_on_shutdown", False)
+        raise
+    finally:
+        try:
+            if not keep_upload and os.path.exists(temp_path):
+                os.remove(temp_path)
+        except Exception as e:
+            logger.error(f"Error cleaning up temp file {temp_path}: {str(e)}")
@@ -0,0 +1,149 @@
+from fastapi import HTTPException, Request, status
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+import asyncio
+import hashlib
+import os
+import tempfile
+
+# Room for the multipart boundaries, part headers and form fields around the file
+MULTIPART_OVERHEAD = 64 * 1024
+MAX_FIELD_SIZE = 16 * 1024
+
+
+def _too_large(max_size: int):
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File too large. Max size is {max_size/1024/1024}MB"
+    )
+
+
+async def receive_upload(request: Request, dest_dir: str, max_size: int, allowed_types=None):
+    """
+    Parses a multipart/form-data body as it arrives, writing the file part straight
+    to a uniquely named file in dest_dir.
+
+    A Content-Length over the limit is refused before any of the body is read, and
+    the file part is size-checked and hashed chunk by chunk as it streams in, so
+    oversized uploads stop at the limit and each upload is written to disk once.
+    Call it from the route instead of declaring File/Form parameters, which FastAPI
+    would read in full before the route's dependencies (auth, rate limit) run.
+
+    Args:
+        request (Request): The incoming request.
+        dest_dir (str): Directory the file is written to.
+        max_size (int): Maximum file size in bytes.
+        allowed_types: File extensions accepted (e.g. ['.pdf']); checked before the file data is read.
+
+    Returns:
+        tuple: (form fields dict, file dict with path, filename, sha256 and size, or None if no file was sent)
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_size + MULTIPART_OVERHEAD:
+        raise _too_large(max_size)
+
+    fields = {}
+    upload = None
+    # Parser callbacks are synchronous; they record events that are handled after each write
+    events = []
+    part = {}
+
+    def on_part_begin():
+        part.clear()
+        part.update(headers={}, header_name=b"", header_value=b"", data=bytearray())
+
+    def on_header_field(data, start, end):
+        part["header_name"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["header_value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["header_name"].lower()] = part["header_value"]
+        part["header_name"], part["header_value"] = b"", b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        part["name"] = options.get(b"name", b"").decode("utf-8", "replace")
+        if options.get(b"filename"):
+            events.append(("file_begin", options[b"filename"].decode("utf-8", "replace")))
+            part["file"] = True
+        elif b"filename" in options:
+            # Browsers send an empty file part when no file was chosen
+            part["file"] = "empty"
+
+    def on_part_data(data, start, end):
+        if part.get("file") == "empty":
+            return
+        if part.get("file"):
+            events.append(("file_data", data[start:end]))
+        else:
+            part["data"] += data[start:end]
+            if len(part["data"]) > MAX_FIELD_SIZE:
+                raise HTTPException(status_code=400, detail="Form field too large")
+
+    def on_part_end():
+        if not part.get("file"):
+            fields[part["name"]] = part["data"].decode("utf-8", "replace")
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    out = None
+    digest = hashlib.sha256()
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_size + MULTIPART_OVERHEAD:
+                raise _too_large(max_size)
+            try:
+                parser.write(chunk)
+            except MultipartParseError:
+                raise HTTPException(status_code=400, detail="Malformed multipart upload")
+
+            data = []
+            for event, value in events:
+                if event == "file_begin":
+                    if upload is not None:
+                        raise HTTPException(status_code=400, detail="Only one file per upload")
+                    suffix = os.path.splitext(value)[1].lower()
+                    if allowed_types is not None and suffix not in allowed_types:
+                        raise HTTPException(status_code=400, detail="Unsupported file type")
+                    os.makedirs(dest_dir, exist_ok=True)
+                    fd, path = tempfile.mkstemp(dir=dest_dir, suffix=suffix)
+                    out = os.fdopen(fd, "wb")
+                    upload = {"path": path, "filename": value, "sha256": None, "size": 0}
+                else:
+                    upload["size"] += len(value)
+                    if upload["size"] > max_size:
+                        raise _too_large(max_size)
+                    digest.update(value)
+                    data.append(value)
+            events.clear()
+            if data:
+                await asyncio.to_thread(out.write, b"".join(data))
+        try:
+            parser.finalize()
+        except MultipartParseError:
+            raise HTTPException(status_code=400, detail="Malformed multipart upload")
+    except BaseException:
+        if out is not None:
+            out.close()
+            os.remove(upload["path"])
+        raise
+
+    if out is not None:
+        out.close()
+        upload["sha256"] = digest.hexdigest()
+    return fields, upload
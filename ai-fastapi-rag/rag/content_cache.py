@@ -0,0 +1,62 @@
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+from db.mongo import embedding_cache_collection, file_cache_collection
+from rag.embedding_codec import EMBEDDING_FIELDS, encode_embedding, decode_embedding
+
+logger = logging.getLogger(__name__)
+
+# Larger files are still deduplicated per chunk, just not cached whole
+FILE_CACHE_MAX_CHARS = 8 * 1024 * 1024
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _embedding_key(model_name: str, chunk_hash: str) -> str:
+    return f"{model_name}:{chunk_hash}"
+
+
+async def get_cached_embeddings(chunk_hashes: List[str], model_name: str) -> Dict[str, List[float]]:
+    """Returns the cached embedding for each chunk hash that has one"""
+    if not chunk_hashes:
+        return {}
+    keys = {_embedding_key(model_name, h): h for h in chunk_hashes}
+    docs = await embedding_cache_collection.find(
+        {"_id": {"$in": list(keys)}},
+        EMBEDDING_FIELDS
+    ).to_list(length=None)
+    return {keys[doc["_id"]]: decode_embedding(doc).tolist() for doc in docs}
+
+
+async def put_cached_embeddings(embeddings: Dict[str, List[float]], model_name: str):
+    if not embeddings:
+        return
+    now = datetime.utcnow()
+    await embedding_cache_collection.bulk_write([
+        UpdateOne(
+            {"_id": _embedding_key(model_name, chunk_hash)},
+            {"$setOnInsert": {**encode_embedding(embedding), "created_at": now}},
+            upsert=True
+        )
+        for chunk_hash, embedding in embeddings.items()
+    ], ordered=False)
+
+
+async def get_file_entry(file_hash: str) -> Optional[Dict]:
+    """Returns the chunks and summary of a previously ingested file"""
+    return await file_cache_collection.find_one({"_id": file_hash})
+
+
+async def put_file_entry(file_hash: str, chunks: List[str], summary: str):
+    if sum(len(chunk) for chunk in chunks) > FILE_CACHE_MAX_CHARS:
+        return
+    await file_cache_collection.update_one(
+        {"_id": file_hash},
+        {"$set": {"chunks": chunks, "summary": summary, "created_at": datetime.utcnow()}},
+        upsert=True
+    )
@@ -0,0 +1,180 @@
+"""Prompt context assembly: merge overlapping chunks, drop near-duplicates, pack into a token budget.
+
+Chunks come from RecursiveCharacterTextSplitter with chunk_overlap, so neighbouring
+hits repeat text. Passages are merged where one ends with the start of another,
+passages mostly contained in a better-scored one are dropped, and the rest are
+packed best-score-first until the budget (in tokens of the LLM's own tokenizer) is
+used up.
+"""
+import logging
+import math
+import os
+import re
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "512"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "1500"))
+# Hub id or local tokenizer.json of the model the prompts are sent to. Unset, tokens are
+# estimated: the default LLM's repo (mistralai/...) is gated, so point this at a local copy
+# of its tokenizer.json, or at the repo along with an HF_TOKEN that has access
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "")
+# Used when the tokenizer can't be loaded (offline, gated repo)
+CHARS_PER_TOKEN = 4
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 200
+DUPLICATE_CONTAINMENT = 0.8  # share of a passage's word 3-grams already in a kept passage
+MIN_PARTIAL_TOKENS = 48  # don't pack a truncated passage shorter than this
+
+_tokenizer = None  # False once loading failed
+_tokenizer_lock = threading.Lock()
+_WORD = re.compile(r"\w+")
+
+
+def get_tokenizer():
+    """Loads the tokenizer once per process; None means token counts are estimated"""
+    global _tokenizer
+    if _tokenizer is None and not CONTEXT_TOKENIZER:
+        logger.warning(f"CONTEXT_TOKENIZER is not set, estimating prompt tokens as {CHARS_PER_TOKEN} characters each")
+        _tokenizer = False
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                try:
+                    from tokenizers import Tokenizer
+                    if os.path.exists(CONTEXT_TOKENIZER):
+                        _tokenizer = Tokenizer.from_file(CONTEXT_TOKENIZER)
+                    else:
+                        _tokenizer = Tokenizer.from_pretrained(CONTEXT_TOKENIZER, token=os.getenv("HF_TOKEN"))
+                    logger.info(f"Loaded prompt tokenizer {CONTEXT_TOKENIZER}")
+                except Exception as e:
+                    logger.warning(f"Tokenizer {CONTEXT_TOKENIZER} unavailable, estimating tokens: {str(e)}")
+                    _tokenizer = False
+    return _tokenizer or None
+
+
+def count_tokens(texts: Sequence[str]) -> List[int]:
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return [math.ceil(len(text) / CHARS_PER_TOKEN) for text in texts]
+    return [len(encoding.ids) for encoding in tokenizer.encode_batch(list(texts), add_special_tokens=False)]
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Cuts text to at most `budget` tokens, backing off to a word boundary"""
+    if budget <= 0:
+        return ""
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        end = budget * CHARS_PER_TOKEN
+    else:
+        offsets = tokenizer.encode(text, add_special_tokens=False).offsets
+        if len(offsets) <= budget:
+            return text
+        end = offsets[budget - 1][1]
+    if end >= len(text):
+        return text
+    cut = text[:end]
+    if not text[end].isspace():
+        space = cut.rfind(" ")
+        if space > 0:
+            cut = cut[:space]
+    return cut.rstrip()
+
+
+def _overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of a that is a prefix of b (0 below MIN_OVERLAP_CHARS)"""
+    tail = a[-MAX_OVERLAP_CHARS:]
+    probe = b[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    start = tail.find(probe)
+    while start != -1:
+        if b.startswith(tail[start:]):
+            return len(tail) - start
+        start = tail.find(probe, start + 1)
+    return 0
+
+
+def merge_overlapping(passages: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
+    """Joins passages that overlap (consecutive splitter chunks) or contain one another.
+
+    The longest overlap is merged first, so a short repeated phrase can't chain
+    unrelated chunks ahead of their real neighbours. A merged passage keeps the
+    position and the best score of its parts.
+    """
+    passages = list(passages)
+    while True:
+        best = None
+        for i, (a, _) in enumerate(passages):
+            for j, (b, _) in enumerate(passages):
+                if i == j:
+                    continue
+                overlap = len(b) if b in a else _overlap(a, b)
+                if overlap and (best is None or overlap > best[0]):
+                    best = (overlap, i, j)
+        if best is None:
+            return passages
+        overlap, i, j = best
+        (a, score_a), (b, score_b) = passages[i], passages[j]
+        text = a if b in a else a + b[overlap:]
+        keep, drop = min(i, j), max(i, j)
+        passages[keep] = (text, max(score_a, score_b))
+        del passages[drop]
+
+
+def _shingles(text: str) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < 3:
+        return set(words)
+    return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def drop_near_duplicates(passages: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
+    """Drops passages whose content is mostly repeated by an earlier (better) passage"""
+    kept = []
+    kept_shingles = []
+    for text, score in passages:
+        shingles = _shingles(text)
+        if shingles and any(len(shingles & other) >= DUPLICATE_CONTAINMENT * len(shingles)
+                            for other in kept_shingles):
+            continue
+        kept.append((text, score))
+        kept_shingles.append(shingles)
+    return kept
+
+
+def assemble_context(documents: Sequence[str], scores: Optional[Sequence[float]] = None,
+                     budget: int = CONTEXT_TOKEN_BUDGET) -> Tuple[str, int]:
+    """Builds the prompt context from retrieved chunks.
+
+    Args:
+        documents: Retrieved chunks, best first.
+        scores: Their retrieval scores (higher is better); rank order is used when missing.
+        budget: Maximum context size in tokens.
+
+    Returns:
+        tuple: (context text, its token count)
+    """
+    if scores is None or len(scores) != len(documents):
+        scores = [-rank for rank in range(len(documents))]
+    passages = [(doc.strip(), float(score)) for doc, score in zip(documents, scores) if doc and doc.strip()]
+    passages.sort(key=lambda passage: passage[1], reverse=True)
+    passages = drop_near_duplicates(merge_overlapping(passages))
+
+    selected = []
+    used = 0
+    for (text, _), tokens in zip(passages, count_tokens([text for text, _ in passages])):
+        remaining = budget - used
+        if tokens <= remaining:
+            selected.append(text)
+            used += tokens
+        elif remaining >= MIN_PARTIAL_TOKENS:
+            text = truncate_to_tokens(text, remaining)
+            if text:
+                selected.append(text)
+                used += count_tokens([text])[0]
+            break
+    return "\n\n".join(selected), used
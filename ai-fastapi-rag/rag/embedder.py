@@ -1,22 +1,286 @@
-from langchain_community.embeddings import HuggingFaceEmbeddings  # Updated import
-from typing import Union, List
-import numpy as np
+from typing import List, Dict, Tuple
+import asyncio
+import itertools
+import logging
+import os
+import threading
+from rag.executor import EmbeddingExecutor, intra_op_threads, EMBEDDING_EXECUTOR
+from rag import onnx_embedder
+from rag.onnx_embedder import OnnxEmbeddings
+from helper.metrics import timer, embedding_batch_size, events_total
+from helper.admission import INTERACTIVE, BACKGROUND, Overloaded
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+EMBEDDING_QUEUE_SIZE = int(os.getenv("EMBEDDING_QUEUE_SIZE", "256"))
+# "torch" (sentence-transformers), "onnx" or "onnx-int8" (ONNX Runtime, see rag/onnx_embedder.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# One model per process, keyed by model name (plus backend when it isn't the default)
+_models: Dict[str, object] = {}
+# Serializes model loading between the warm-up thread and first requests
+_models_lock = threading.RLock()
+# (model name, backend) pairs whose ONNX load failed; they resolve to torch from then on
+_unavailable_backends = set()
+_batchers: Dict[int, "EmbeddingBatcher"] = {}
+
+
+class EmbeddingBatcher:
+    """Collects concurrent embedding calls into micro-batches for a single model.
+
+    Interactive texts (queries) are batched ahead of background ones (document chunks).
+    A batch holds at most max_batch_size texts: larger submits are queued in pieces,
+    and a call that doesn't fit waits for the next batch. Background submitters wait
+    for queue room; interactive ones fail fast with Overloaded once queue_size of them
+    are already waiting.
+    """
+
+    def __init__(self, model, max_batch_size: int = EMBEDDING_BATCH_SIZE,
+                 max_wait_ms: float = EMBEDDING_BATCH_WAIT_MS, queue_size: int = EMBEDDING_QUEUE_SIZE):
+        self.model = model
+        self.executor = EmbeddingExecutor(model.model_name, getattr(model, "backend", None))
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue_size = queue_size
+        self._queue = None
+        self._worker = None
+        self._inflight = set()
+        self._sequence = itertools.count()
+        self._interactive_waiting = 0
+        self._background_room = None
+        self._carry = None
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            # Ordered by (priority, arrival); bounded per priority in submit()
+            self._queue = asyncio.PriorityQueue()
+            self._background_room = asyncio.Semaphore(self.queue_size)
+            self._interactive_waiting = 0
+            self._carry = None
+            self._worker = asyncio.create_task(self._run())
+
+    async def submit(self, texts: List[str], priority: int = BACKGROUND) -> List[List[float]]:
+        """Queue texts for the next batch and wait for their embeddings"""
+        if len(texts) > self.max_batch_size:
+            parts = await asyncio.gather(*(
+                self._submit(texts[i:i + self.max_batch_size], priority)
+                for i in range(0, len(texts), self.max_batch_size)
+            ))
+            return [vector for part in parts for vector in part]
+        return await self._submit(texts, priority)
+
+    async def _submit(self, texts: List[str], priority: int) -> List[List[float]]:
+        if not texts:
+            return []
+        self._ensure_worker()
+        if priority == INTERACTIVE:
+            if self._interactive_waiting >= self.queue_size:
+                events_total.inc(event="admission_rejected", resource="embedding", reason="queue_full",
+                                 priority="interactive")
+                raise Overloaded("embedding", 503, 1, "Embedding service is busy, please retry shortly")
+            self._interactive_waiting += 1
+        else:
+            # Backpressure: wait until the batcher has taken earlier background texts
+            await self._background_room.acquire()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((priority, next(self._sequence), texts, future))
+        return await future
+
+    def _take(self, item) -> Tuple[List[str], asyncio.Future]:
+        priority, _, texts, future = item
+        if priority == INTERACTIVE:
+            self._interactive_waiting -= 1
+        else:
+            self._background_room.release()
+        return texts, future
+
+    async def _collect(self) -> List[Tuple[List[str], asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        if self._carry is not None:
+            items, self._carry = [self._carry], None
+        else:
+            items = [self._take(await self._queue.get())]
+        size = len(items[0][0])
+        deadline = loop.time() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            item = self._take(item)
+            if size + len(item[0]) > self.max_batch_size:
+                self._carry = item
+                break
+            items.append(item)
+            size += len(item[0])
+        return items
+
+    async def _run(self):
+        while True:
+            items = await self._collect()
+            # Stop draining the queue until the pool has room for this batch
+            await self.executor.acquire()
+            task = asyncio.create_task(self._dispatch(items))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, items: List[Tuple[List[str], asyncio.Future]]):
+        texts = [text for batch, _ in items for text in batch]
+        embedding_batch_size.observe(len(texts))
+        try:
+            with timer("embed_batch"):
+                vectors = await self.executor.run(self.model, texts)
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(texts)} failed: {str(e)}")
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.executor.release()
+
+        offset = 0
+        for batch, future in items:
+            if not future.done():
+                future.set_result(vectors[offset:offset + len(batch)])
+            offset += len(batch)
+
+    async def close(self):
+        tasks = list(self._inflight)
+        if self._worker is not None:
+            tasks.append(self._worker)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker = None
+        await asyncio.to_thread(self.executor.shutdown)
+
+
+def _get_batcher(model) -> EmbeddingBatcher:
+    batcher = _batchers.get(id(model))
+    if batcher is None:
+        batcher = _batchers[id(model)] = EmbeddingBatcher(model)
+    return batcher
+
+
+class AsyncOnnxEmbeddings(OnnxEmbeddings):
+    """ONNX Runtime embeddings with the same batched async methods"""
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await _get_batcher(self).submit(texts, BACKGROUND)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vectors = await _get_batcher(self).submit([text], INTERACTIVE)
+        return vectors[0]
+
+
+class PooledEmbeddings:
+    """The async embedding methods for a model loaded only in the process pool
+    (EMBEDDING_EXECUTOR=process), so the API process doesn't hold a copy of it"""
+
+    def __init__(self, model_name: str, backend: str):
+        self.model_name = model_name
+        self.backend = backend
+
+    @property
+    def cache_namespace(self) -> str:
+        # Same keys as OnnxEmbeddings/the torch model would use in this process
+        return f"{self.model_name}:int8" if self.backend == "onnx-int8" else self.model_name
 
-class AsyncHuggingFaceEmbeddings(HuggingFaceEmbeddings):
-    """Wrapper to add async methods to HuggingFaceEmbeddings"""
-    
     async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
-        """Async embed documents"""
-        return self.embed_documents(texts)
-    
+        return await _get_batcher(self).submit(texts, BACKGROUND)
+
     async def aembed_query(self, text: str) -> List[float]:
-        """Async embed query"""
-        return self.embed_query(text)
+        vectors = await _get_batcher(self).submit([text], INTERACTIVE)
+        return vectors[0]
 
-def get_embedding_function(model_name: str = "sentence-transformers/all-MiniLM-L6-v2") -> AsyncHuggingFaceEmbeddings:
-    """Returns embedding function with async support"""
+def _resolve_backend(model_name: str, backend: str = None) -> str:
+    backend = backend or EMBEDDING_BACKEND
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    return "torch" if (model_name, backend) in _unavailable_backends else backend
+
+def _model_key(model_name: str, backend: str) -> str:
+    return model_name if backend == EMBEDDING_BACKEND else f"{model_name}@{backend}"
+
+def _load_torch_model(model_name: str):
+    # Deferred: importing langchain/sentence-transformers is most of a cold start
+    import torch
+    from rag.hf_embedder import AsyncHuggingFaceEmbeddings
+    torch.set_num_threads(intra_op_threads())
     return AsyncHuggingFaceEmbeddings(
         model_name=model_name,
         model_kwargs={'device': 'cpu'},  # Change to 'cuda' if you have GPU
         encode_kwargs={'normalize_embeddings': True}
-    )
\ No newline at end of file
+    )
+
+def get_embedding_function(model_name: str = DEFAULT_MODEL_NAME, backend: str = None):
+    """Returns the process-wide embedding function with async support.
+
+    With EMBEDDING_EXECUTOR=process this is a PooledEmbeddings and the model is
+    loaded only in the pool's processes.
+    """
+    if EMBEDDING_EXECUTOR == "process":
+        backend = _resolve_backend(model_name, backend)
+        key = _model_key(model_name, backend)
+        with _models_lock:
+            if key not in _models:
+                _models[key] = PooledEmbeddings(model_name, backend)
+        return _models[key]
+    return load_embedding_model(model_name, backend)
+
+def load_embedding_model(model_name: str = DEFAULT_MODEL_NAME, backend: str = None):
+    """Loads (once per process) the model itself, with sync embed_documents/embed_query.
+
+    If an ONNX backend can't be loaded the torch model is returned instead (and
+    cached under the torch key), with a warning; check the returned type when the
+    backend matters.
+    """
+    backend = _resolve_backend(model_name, backend)
+    model = _models.get(_model_key(model_name, backend))
+    if model is None:
+        with _models_lock:
+            backend = _resolve_backend(model_name, backend)
+            key = _model_key(model_name, backend)
+            model = _models.get(key)
+            if model is None:
+                logger.info(f"Loading embedding model {model_name} ({backend})")
+                if backend == "torch":
+                    model = _models[key] = _load_torch_model(model_name)
+                else:
+                    try:
+                        model = _models[key] = AsyncOnnxEmbeddings(model_name, quantize=backend == "onnx-int8",
+                                                                   threads=onnx_embedder.ONNX_THREADS or intra_op_threads())
+                    except Exception as e:
+                        logger.warning(f"Embedding backend {backend} unavailable for {model_name}, "
+                                       f"falling back to torch: {str(e)}")
+                        _unavailable_backends.add((model_name, backend))
+                        model = load_embedding_model(model_name, "torch")
+    return model
+
+async def aget_embedding_function(model_name: str = DEFAULT_MODEL_NAME, backend: str = None):
+    """get_embedding_function without blocking the event loop while the model loads"""
+    model = _models.get(_model_key(model_name, _resolve_backend(model_name, backend)))
+    if model is not None:
+        return model
+    return await asyncio.to_thread(get_embedding_function, model_name, backend)
+
+async def warm_up_embedding_function(model_name: str = DEFAULT_MODEL_NAME):
+    """Loads the model and runs one inference so the first request doesn't pay for it"""
+    model = await aget_embedding_function(model_name)
+    await model.aembed_query("warm up")
+    logger.info(f"Embedding model {model_name} warmed up")
+    return model
+
+async def close_embedding_functions():
+    """Stops the batching workers"""
+    for batcher in list(_batchers.values()):
+        await batcher.close()
+    _batchers.clear()
@@ -0,0 +1,74 @@
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+from bson.binary import Binary
+
+# How chunk embeddings are written to Mongo: "list" (BSON doubles, legacy),
+# "float32", "float16" or "int8" (packed little-endian bytes in embedding_bin)
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "float32")
+
+_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2"),
+    "int8": np.dtype("i1"),
+}
+
+# Fields a query needs to decode an embedding in any storage format
+EMBEDDING_FIELDS = {"embedding": 1, "embedding_bin": 1, "embedding_dtype": 1, "embedding_scale": 1}
+
+
+def encode_embedding(embedding, storage: str = None) -> Dict:
+    """Returns the document fields that store one embedding"""
+    storage = storage or EMBEDDING_STORAGE
+    if storage == "list":
+        return {"embedding": [float(x) for x in embedding]}
+    if storage not in _DTYPES:
+        raise ValueError(f"Unknown embedding storage: {storage}")
+
+    vector = np.asarray(embedding, dtype=np.float32)
+    fields = {"embedding_dtype": storage}
+    if storage == "int8":
+        # Symmetric per-vector quantization
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        fields["embedding_scale"] = scale
+        vector = np.round(vector / scale)
+    fields["embedding_bin"] = Binary(vector.astype(_DTYPES[storage]).tobytes())
+    return fields
+
+
+def has_embedding(doc: Dict) -> bool:
+    return "embedding_bin" in doc or "embedding" in doc
+
+
+def decode_embedding(doc: Dict) -> np.ndarray:
+    """Decodes one stored embedding to float32 (a zero-copy view for float32 blobs)"""
+    if "embedding_bin" not in doc:
+        return np.asarray(doc["embedding"], dtype=np.float32)
+    vector = np.frombuffer(doc["embedding_bin"], dtype=_DTYPES[doc["embedding_dtype"]])
+    if doc["embedding_dtype"] == "int8":
+        return vector.astype(np.float32) * doc["embedding_scale"]
+    return vector.astype(np.float32, copy=False)
+
+
+def decode_embeddings(docs: List[Dict]) -> Tuple[np.ndarray, List[Dict]]:
+    """Stacks the embeddings of docs into one float32 matrix.
+
+    Returns the matrix and the docs that had an embedding, in row order.
+    """
+    kept = [doc for doc in docs if has_embedding(doc)]
+    if not kept:
+        return np.empty((0, 0), dtype=np.float32), kept
+
+    dtypes = {doc.get("embedding_dtype") for doc in kept}
+    if len(dtypes) == 1 and "embedding_bin" in kept[0]:
+        # Single packed format: join the blobs and decode with one frombuffer
+        storage = kept[0]["embedding_dtype"]
+        matrix = np.frombuffer(b"".join(doc["embedding_bin"] for doc in kept), dtype=_DTYPES[storage])
+        matrix = matrix.reshape(len(kept), -1)
+        if storage == "int8":
+            scales = np.array([doc["embedding_scale"] for doc in kept], dtype=np.float32)
+            return matrix.astype(np.float32) * scales[:, None], kept
+        return matrix.astype(np.float32, copy=False), kept
+
+    return np.vstack([decode_embedding(doc) for doc in kept]), kept
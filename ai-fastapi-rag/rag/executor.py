@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List, Optional
+import asyncio
+import logging
+import multiprocessing
+import os
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_EXECUTOR = os.getenv("EMBEDDING_EXECUTOR", "thread")  # "thread" or "process"
+# Each model call is itself multi-threaded, so thread mode runs two calls at a time (one
+# batch overlaps the next) rather than one per core; process mode splits the cores
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "0")) or (
+    (os.cpu_count() or 1) if EMBEDDING_EXECUTOR == "process" else min(2, os.cpu_count() or 1)
+)
+EMBEDDING_MAX_PENDING = int(os.getenv("EMBEDDING_MAX_PENDING", "0")) or EMBEDDING_WORKERS * 2
+
+# Model loaded inside each pool process (process mode only)
+_worker_model = None
+
+
+def intra_op_threads(max_workers: int = EMBEDDING_WORKERS) -> int:
+    """Threads per model call so the pool's concurrent calls use each core about once"""
+    return max(1, (os.cpu_count() or 1) // max_workers)
+
+
+def _init_worker(model_name: str, backend: str, threads_per_worker: int):
+    global _worker_model
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+    import rag.onnx_embedder as onnx_embedder
+    if not onnx_embedder.ONNX_THREADS:
+        onnx_embedder.ONNX_THREADS = threads_per_worker
+    from rag.embedder import load_embedding_model
+    _worker_model = load_embedding_model(model_name, backend)
+
+
+def _embed_in_worker(texts: List[str]) -> List[List[float]]:
+    return _worker_model.embed_documents(texts)
+
+
+class EmbeddingExecutor:
+    """Runs embedding off the event loop on a bounded thread or process pool"""
+
+    def __init__(self, model_name: str, backend: str = None, kind: str = EMBEDDING_EXECUTOR,
+                 max_workers: int = EMBEDDING_WORKERS, max_pending: int = EMBEDDING_MAX_PENDING):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown embedding executor: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        if kind == "process":
+            threads_per_worker = intra_op_threads(max_workers)
+            # spawn, not fork: forking copies the event loop, Motor/Redis sockets and
+            # torch's thread pools (which deadlock in a forked child) into every worker
+            self._pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(model_name, backend, threads_per_worker)
+            )
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embedder")
+        logger.info(f"Embedding executor: {kind} pool with {max_workers} workers, {self.max_pending} max pending")
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        return self._slots
+
+    async def acquire(self):
+        """Waits for room in the pool queue (backpressure)"""
+        await self._get_slots().acquire()
+
+    def release(self):
+        self._get_slots().release()
+
+    async def run(self, model, texts: List[str]) -> List[List[float]]:
+        """Embeds texts on the pool. Callers should hold a slot from acquire()"""
+        loop = asyncio.get_running_loop()
+        if self.kind == "process":
+            return await loop.run_in_executor(self._pool, _embed_in_worker, texts)
+        return await loop.run_in_executor(self._pool, model.embed_documents, texts)
+
+    async def embed(self, model, texts: List[str]) -> List[List[float]]:
+        await self.acquire()
+        try:
+            return await self.run(model, texts)
+        finally:
+            self.release()
+
+    def shutdown(self):
+        """Stops the pool; blocks until process workers have exited"""
+        self._pool.shutdown(wait=self.kind == "process", cancel_futures=True)
@@ -0,0 +1,22 @@
+"""Torch (sentence-transformers) embedding backend.
+
+Kept out of rag/embedder.py so langchain and sentence-transformers are only
+imported when this backend is actually loaded.
+"""
+from typing import List
+from langchain_community.embeddings import HuggingFaceEmbeddings  # Updated import
+from rag.embedder import _get_batcher
+from helper.admission import INTERACTIVE, BACKGROUND
+
+
+class AsyncHuggingFaceEmbeddings(HuggingFaceEmbeddings):
+    """Wrapper to add async methods to HuggingFaceEmbeddings"""
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Async embed documents, batched with other concurrent callers"""
+        return await _get_batcher(self).submit(texts, BACKGROUND)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Async embed query, batched with other concurrent callers"""
+        vectors = await _get_batcher(self).submit([text], INTERACTIVE)
+        return vectors[0]
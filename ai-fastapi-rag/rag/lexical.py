@@ -0,0 +1,137 @@
+import math
+import os
+import re
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from db.mongo import documents_collection, chat_terms_collection
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Query terms in more than this share of a chat's chunks are skipped
+BM25_MAX_DF_RATIO = float(os.getenv("BM25_MAX_DF_RATIO", "0.5"))
+# Postings scored per question, whatever the chat size
+BM25_MAX_POSTINGS = int(os.getenv("BM25_MAX_POSTINGS", "2000"))
+# Chats whose term statistics are kept in process, like rag/matrix_cache.py: valid for the
+# doc_version they were read at, or for TERM_STATS_CACHE_TTL when the caller has no version
+TERM_STATS_CACHE_SIZE = int(os.getenv("TERM_STATS_CACHE_SIZE", "256"))
+TERM_STATS_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "300"))
+
+# stats key -> (stats document, doc_version, time read)
+_term_stats: "OrderedDict[str, Tuple[Dict, Optional[int], float]]" = OrderedDict()
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is",
+    "it", "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "what", "which",
+    "who", "will", "with", "how", "why", "when", "does", "do", "did", "can", "i", "you",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def term_fields(chunk: str) -> Dict:
+    """Inverted-index fields stored on each chunk document"""
+    tokens = tokenize(chunk)
+    tf = Counter(tokens)
+    return {"tokens": list(tf), "tf": dict(tf), "length": len(tokens)}
+
+
+def _stats_key(user_id: str, chat_id: str) -> str:
+    return f"{user_id}:{chat_id}"
+
+
+async def update_term_stats(user_id: str, chat_id: str, docs: List[Dict]):
+    """Adds newly stored chunks to the chat's BM25 statistics"""
+    df = Counter(token for doc in docs for token in doc["tokens"])
+    inc = {"n": len(docs), "total_length": sum(doc["length"] for doc in docs)}
+    inc.update({f"df.{token}": count for token, count in df.items()})
+    await chat_terms_collection.update_one(
+        {"_id": _stats_key(user_id, chat_id)},
+        {"$inc": inc},
+        upsert=True
+    )
+    _term_stats.pop(_stats_key(user_id, chat_id), None)
+
+
+async def _get_term_stats(user_id: str, chat_id: str, doc_version: Optional[int] = None) -> Optional[Dict]:
+    """The chat's BM25 statistics (n, total_length, df), read from Mongo once per doc_version"""
+    key = _stats_key(user_id, chat_id)
+    entry = _term_stats.get(key)
+    if entry is not None and entry[1] == doc_version and time.monotonic() - entry[2] <= TERM_STATS_CACHE_TTL:
+        _term_stats.move_to_end(key)
+        return entry[0]
+    stats = await chat_terms_collection.find_one({"_id": key})
+    if stats:
+        _term_stats[key] = (stats, doc_version, time.monotonic())
+        _term_stats.move_to_end(key)
+        while len(_term_stats) > TERM_STATS_CACHE_SIZE:
+            _term_stats.popitem(last=False)
+    return stats
+
+
+async def bm25_search(user_id: str, chat_id: str, query: str, limit: int,
+                      doc_version: Optional[int] = None) -> List[Tuple[Dict, float]]:
+    """
+    Scores the chat's chunks that share a term with the query.
+
+    Postings are scored from tf/length only; the chunk text is then fetched for the
+    top `limit` ids, so each question reads a bounded amount of data. The term
+    statistics come from an in-process cache (see _get_term_stats).
+
+    Returns:
+        list: (chunk document, BM25 score), best first.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+
+    stats = await _get_term_stats(user_id, chat_id, doc_version)
+    if not stats or not stats.get("n"):
+        return []
+    n = stats["n"]
+    avg_length = stats["total_length"] / n or 1
+    df = stats.get("df", {})
+    terms = [term for term in terms if df.get(term)]
+    if not terms:
+        return []
+    # Terms in most chunks add little score but most of the postings; keep the rarest if all are common
+    rare = [term for term in terms if df[term] <= BM25_MAX_DF_RATIO * n]
+    terms = rare or [min(terms, key=lambda term: df[term])]
+    idf = {term: math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5)) for term in terms}
+
+    postings = await documents_collection.find(
+        {"user_id": user_id, "chat_id": chat_id, "tokens": {"$in": terms}},
+        {"length": 1, **{f"tf.{term}": 1 for term in terms}}
+    ).limit(BM25_MAX_POSTINGS).to_list(length=None)
+
+    scored = []
+    for doc in postings:
+        tf = doc.get("tf", {})
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc.get("length", 0) / avg_length)
+        score = sum(idf[t] * tf[t] * (BM25_K1 + 1) / (tf[t] + norm) for t in terms if t in tf)
+        scored.append((doc["_id"], score))
+    scored.sort(key=lambda item: item[1], reverse=True)
+    scored = scored[:limit]
+    if not scored:
+        return []
+
+    docs = await documents_collection.find(
+        {"_id": {"$in": [_id for _id, _ in scored]}},
+        {"chunk": 1}
+    ).to_list(length=None)
+    by_id = {doc["_id"]: doc for doc in docs}
+    return [(by_id[_id], score) for _id, score in scored if _id in by_id]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], top_k: int, k: int = 60) -> Tuple[List[str], List[float]]:
+    """Fuses ranked lists of chunks; a chunk scores sum(1 / (k + rank)) over the lists"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking):
+            scores[chunk] = scores.get(chunk, 0.0) + 1.0 / (k + rank + 1)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [chunk for chunk, _ in fused], [score for _, score in fused]
@@ -0,0 +1,89 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "256")) * 1024 * 1024
+# Other workers can't invalidate our copy, so entries also expire after a while
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "300"))
+
+
+class EmbeddingMatrixCache:
+    """LRU cache of normalized embedding matrices and chunk texts per (user_id, chat_id)"""
+
+    def __init__(self, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES, ttl: float = EMBEDDING_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[np.ndarray, List[str], int, float, Optional[int]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _size(matrix: np.ndarray, chunks: List[str]) -> int:
+        return matrix.nbytes + sum(len(chunk) for chunk in chunks)
+
+    def get(self, key: Tuple[str, str], version: Optional[int] = None) -> Optional[Tuple[np.ndarray, List[str]]]:
+        """version is the chat's doc_version; an entry built for another version is dropped.
+
+        Other workers can't invalidate our copy after an upload, but they bump the
+        doc_version in Redis, so callers that pass it never see a stale matrix. The TTL
+        only bounds staleness for callers without it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (time.monotonic() - entry[3] > self.ttl
+                                      or (version is not None and entry[4] != version)):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key: Tuple[str, str], matrix: np.ndarray, chunks: List[str], version: Optional[int] = None):
+        size = self._size(matrix, chunks)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (matrix, chunks, size, time.monotonic(), version)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: Tuple[str, str]):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def _remove(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[2]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+matrix_cache = EmbeddingMatrixCache()
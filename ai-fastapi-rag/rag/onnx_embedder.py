@@ -0,0 +1,132 @@
+"""ONNX Runtime backend for the sentence-transformers embedding model.
+
+The model is exported once from the locally cached Hugging Face weights into
+ONNX_MODEL_DIR (optionally with dynamic int8 weight quantization) and then runs
+with only onnxruntime, tokenizers and numpy. Pooling matches MiniLM's
+sentence-transformers pipeline: attention-masked mean, then L2 normalization.
+"""
+from typing import List
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "onnx_models")
+# MiniLM's sentence-transformers config truncates at 256 word pieces
+ONNX_MAX_LENGTH = int(os.getenv("ONNX_MAX_LENGTH", "256"))
+# Texts per session.run; inputs are length-sorted first so batches pad little
+ONNX_BATCH_SIZE = int(os.getenv("ONNX_BATCH_SIZE", "32"))
+# Intra-op threads per session (0: the cores divided among the embedding pool's workers)
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+
+
+def _model_dir(model_name: str) -> str:
+    return os.path.join(ONNX_MODEL_DIR, model_name.strip("/").replace("/", "__"))
+
+
+def export_onnx_model(model_name: str, quantize: bool = False) -> str:
+    """Converts the Hugging Face weights to ONNX, reusing earlier exports; returns the model path"""
+    directory = _model_dir(model_name)
+    fp32_path = os.path.join(directory, "model.onnx")
+    int8_path = os.path.join(directory, "model.int8.onnx")
+    # Pool workers may export concurrently; each writes its own temp file and renames atomically
+    suffix = f".{os.getpid()}.tmp"
+
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        logger.info(f"Exporting {model_name} to ONNX in {directory}")
+        os.makedirs(directory, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        tokenizer.save_pretrained(directory)
+
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        axes = {name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]}
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in names),
+                fp32_path + suffix,
+                input_names=names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=axes,
+                opset_version=14
+            )
+        os.replace(fp32_path + suffix, fp32_path)
+
+    if not quantize:
+        return fp32_path
+
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info(f"Quantizing {fp32_path} to int8")
+        quantize_dynamic(fp32_path, int8_path + suffix, weight_type=QuantType.QInt8)
+        os.replace(int8_path + suffix, int8_path)
+    return int8_path
+
+
+class OnnxEmbeddings:
+    """Sentence embeddings computed with ONNX Runtime (embed_documents/embed_query like langchain's)"""
+
+    def __init__(self, model_name: str, quantize: bool = False, max_length: int = ONNX_MAX_LENGTH,
+                 batch_size: int = ONNX_BATCH_SIZE, threads: int = None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        path = export_onnx_model(model_name, quantize)
+        self.model_name = model_name
+        self.quantized = quantize
+        self.batch_size = batch_size
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(os.path.dirname(path), "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = ONNX_THREADS if threads is None else threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        logger.info(f"Loaded ONNX embedding model {path}")
+
+    @property
+    def cache_namespace(self) -> str:
+        """Key prefix for cached embeddings; int8 vectors drift, so they are kept apart"""
+        return f"{self.model_name}:int8" if self.quantized else self.model_name
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask
+        }
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        hidden = self.session.run(None, feeds)[0]
+
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            result = self._embed_batch([texts[i] for i in batch])
+            if vectors.shape[1] == 0:
+                vectors = np.empty((len(texts), result.shape[1]), dtype=np.float32)
+            vectors[batch] = result
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -1,77 +1,126 @@
-# import chromadb
-# from chromadb.utils import embedding_functions
-
-import numpy as np
+import asyncio
+import logging
+import os
+from fastapi import HTTPException
 from db.mongo import documents_collection
-from sklearn.metrics.pairwise import cosine_similarity
+from rag.vector_index import get_vector_index
+from rag.lexical import term_fields, update_term_stats, bm25_search, reciprocal_rank_fusion
+from rag.embedding_codec import encode_embedding
+from rag.matrix_cache import matrix_cache
+from helper.metrics import timer, events_total
+from rag.content_cache import hash_text, get_cached_embeddings, put_cached_embeddings
+
+logger = logging.getLogger(__name__)
+
+# "hybrid" fuses BM25 and vector rankings, "vector" is dense retrieval only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+LEXICAL_CANDIDATES = int(os.getenv("LEXICAL_CANDIDATES", "50"))
+VECTOR_CANDIDATES = int(os.getenv("VECTOR_CANDIDATES", "20"))
 
 async def store_documents(chunks, embed_fn, user_id, chat_id):
-    print("Type of chunks:", type(chunks))
-    print("Type of first chunk:", type(chunks[0]) if chunks else "empty")
-    print("Length of chunks:", len(chunks))
-    print("Sample chunk content:", chunks[0][:100] if chunks else "empty")
+    logger.debug("store_documents chat_id=%s chunks=%d sample=%r",
+                 chat_id, len(chunks), chunks[0][:100] if chunks else "")
     clean_chunks = [str(chunk) for chunk in chunks if isinstance(chunk, str) and chunk.strip()]
-    embeddings = await embed_fn.aembed_documents(clean_chunks)
-    
-     
+    if not clean_chunks:
+        return 0
+
+    # Skip chunks this chat already has (same file uploaded twice, repeated boilerplate)
+    hashes = [hash_text(chunk) for chunk in clean_chunks]
+    with timer("store_dedup_lookup"):
+        existing = await documents_collection.find(
+            {"user_id": user_id, "chat_id": chat_id, "chunk_hash": {"$in": list(set(hashes))}},
+            {"_id": 0, "chunk_hash": 1}
+        ).to_list(length=None)
+    seen = {doc["chunk_hash"] for doc in existing}
+    new_chunks = []
+    new_hashes = []
+    for chunk, chunk_hash in zip(clean_chunks, hashes):
+        if chunk_hash not in seen:
+            seen.add(chunk_hash)
+            new_chunks.append(chunk)
+            new_hashes.append(chunk_hash)
+    if not new_chunks:
+        return 0
+
+    # Only embed chunks no upload has embedded before
+    model_name = getattr(embed_fn, "cache_namespace", None) or getattr(embed_fn, "model_name", "default")
+    cached = await get_cached_embeddings(new_hashes, model_name)
+    missing = [i for i, chunk_hash in enumerate(new_hashes) if chunk_hash not in cached]
+    events_total.inc(len(new_hashes) - len(missing), event="embedding_cache_hit")
+    events_total.inc(len(missing), event="embedding_cache_miss")
+    if missing:
+        with timer("embed_documents"):
+            computed = await embed_fn.aembed_documents([new_chunks[i] for i in missing])
+        fresh = {new_hashes[i]: embedding for i, embedding in zip(missing, computed)}
+        await put_cached_embeddings(fresh, model_name)
+        cached.update(fresh)
+    embeddings = [cached[chunk_hash] for chunk_hash in new_hashes]
+
     docs_to_store = []
 
-    for i in range(len(chunks)):
+    for i in range(len(new_chunks)):
         docs_to_store.append({
             "user_id": user_id,
-            "chunk": clean_chunks[i],
-            "embedding": embeddings[i],
+            "chunk": new_chunks[i],
+            "chunk_hash": new_hashes[i],
+            **encode_embedding(embeddings[i]),
+            **term_fields(new_chunks[i]),
             "chat_id": chat_id,
         })
-    
-    await documents_collection.insert_many(docs_to_store)
+
+    with timer("store_insert"):
+        result = await documents_collection.insert_many(docs_to_store)
+        await update_term_stats(user_id, chat_id, docs_to_store)
+    matrix_cache.invalidate((user_id, chat_id))
+
+    # Add the new chunks to the chat's vector index
+    with timer("index_add"):
+        await get_vector_index(user_id, chat_id).add(
+            [str(_id) for _id in result.inserted_ids],
+            embeddings,
+            new_chunks
+        )
+    return len(new_chunks)
 
 
-async def retrieve_similar_docs(question, embed_fn, user_id, chat_id, top_k=5):
+async def _lexical_search(index, question, doc_version=None):
+    with timer("lexical_search"):
+        return await bm25_search(index.user_id, index.chat_id, question, LEXICAL_CANDIDATES, doc_version)
+
+
+async def _hybrid_search(index, question, question_embedding, top_k, doc_version=None):
+    """Fuses the BM25 ranking with the full dense ranking (RRF), both run concurrently.
+
+    The dense side is the index's own query (matrix cache or HNSW), so chunks only
+    the embedding finds still make the fused list.
+    """
+    lexical, (vector_ranking, _) = await asyncio.gather(
+        _lexical_search(index, question, doc_version),
+        index.query(question_embedding, VECTOR_CANDIDATES, doc_version)
+    )
+    return reciprocal_rank_fusion([[doc["chunk"] for doc, _ in lexical], vector_ranking], top_k)
+
+
+async def retrieve_similar_docs(question, embed_fn, user_id, chat_id, top_k=5, question_embedding=None,
+                                doc_version=None):
     try:
-        # Get question embedding (sync version)
-        question_embedding = embed_fn.embed_query(question)
-        question_embedding = np.array(question_embedding).reshape(1, -1)
+        # Get question embedding (batched with concurrent questions) unless the caller has it
+        if question_embedding is None:
+            question_embedding = await embed_fn.aembed_query(question)
 
-        # Get documents from MongoDB
-        docs = await documents_collection.find({
-            "user_id": user_id,
-            "chat_id": chat_id
-        }).to_list(length=1000)
-
-        # In retrieve_similar_docs()
-        print(f"\nRETRIEVED DOCUMENTS: {len(docs)}")
-        for i, doc in enumerate(docs[:3]):
-            print(f"DOC {i}: {doc['chunk'][:100]}...")
-
-        if not docs:
-            return {
-                "documents": [],
-                "scores": []
-            }
-
-        # Prepare embeddings and chunks
-        embeddings = []
-        chunks = []
-        for doc in docs:
-            if "embedding" in doc and "chunk" in doc:
-                embeddings.append(doc["embedding"])
-                chunks.append(doc["chunk"])
-
-        if not embeddings:
-            return {
-                "documents": [],
-                "scores": []
-            }
-
-        # Calculate similarities
-        embeddings_array = np.array(embeddings)
-        sims = cosine_similarity(question_embedding, embeddings_array)[0]
-        top_indices = np.argsort(sims)[::-1][:top_k]
+        index = get_vector_index(user_id, chat_id)
+        if RETRIEVAL_MODE == "vector":
+            documents, scores = await index.query(question_embedding, top_k, doc_version)
+        else:
+            documents, scores = await _hybrid_search(index, question, question_embedding, top_k, doc_version)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("retrieved chat_id=%s count=%d top=%r",
+                         chat_id, len(documents), [doc[:100] for doc in documents[:3]])
 
         return {
-            "documents": [chunks[i] for i in top_indices],
-            "scores": [float(sims[i]) for i in top_indices]
+            "documents": documents,
+            "scores": scores
         }
 
     except Exception as e:
@@ -0,0 +1,241 @@
+from abc import ABC, abstractmethod
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from db.mongo import documents_collection
+from rag.embedding_codec import EMBEDDING_FIELDS, decode_embeddings
+from rag.matrix_cache import matrix_cache
+from helper.metrics import timer
+
+logger = logging.getLogger(__name__)
+
+# A Chroma server shared by every API and ingestion process; without one, Chroma runs
+# embedded in each process (chroma_store/), which only suits a single process
+CHROMA_HOST = os.getenv("CHROMA_HOST", "")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+CHROMA_PATH = os.getenv("CHROMA_PATH", "chroma_store")
+# "hnsw" keeps an HNSW index per chat in Chroma, "exact" scans Mongo
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "hnsw" if CHROMA_HOST else "exact")
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+BACKFILL_BATCH_SIZE = 1000
+# How often a chat's index count is compared with Mongo (catches chunks stored by other
+# processes whose index update failed)
+HNSW_SYNC_INTERVAL = float(os.getenv("HNSW_SYNC_INTERVAL", "30"))
+
+_indexes: Dict[Tuple[str, str, str], "VectorIndex"] = {}
+_chroma_client = None
+
+
+class VectorIndex(ABC):
+    """Similarity search over the chunks of one (user_id, chat_id)"""
+
+    def __init__(self, user_id: str, chat_id: str):
+        self.user_id = user_id
+        self.chat_id = chat_id
+
+    @abstractmethod
+    async def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str]):
+        """Indexes new chunks"""
+
+    @abstractmethod
+    async def query(self, embedding: List[float], top_k: int,
+                    doc_version: Optional[int] = None) -> Tuple[List[str], List[float]]:
+        """Returns the top_k chunks and their cosine similarity, best first.
+
+        doc_version is the chat's current version from Redis, when the caller has it.
+        """
+
+
+class ExactVectorIndex(VectorIndex):
+    """Brute-force cosine similarity over every chunk stored in Mongo.
+
+    The normalized matrix is kept in matrix_cache so follow-up questions skip Mongo.
+    """
+
+    async def add(self, ids, embeddings, documents):
+        # Mongo is the store, nothing else to update
+        pass
+
+    async def _load(self, doc_version=None):
+        key = (self.user_id, self.chat_id)
+        cached = matrix_cache.get(key, doc_version)
+        if cached is not None:
+            return cached
+
+        with timer("mongo_fetch"):
+            docs = await documents_collection.find(
+                {"user_id": self.user_id, "chat_id": self.chat_id},
+                {"chunk": 1, **EMBEDDING_FIELDS}
+            ).to_list(length=None)
+
+        matrix, docs = decode_embeddings([doc for doc in docs if "chunk" in doc])
+        chunks = [doc["chunk"] for doc in docs]
+        if docs:
+            matrix = matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12)
+            matrix_cache.put(key, matrix, chunks, doc_version)
+        return matrix, chunks
+
+    async def query(self, embedding, top_k, doc_version=None):
+        matrix, chunks = await self._load(doc_version)
+        if not chunks:
+            return [], []
+
+        with timer("similarity"):
+            query = np.asarray(embedding, dtype=np.float32)
+            query /= np.linalg.norm(query) + 1e-12
+            sims = matrix @ query
+
+            k = min(top_k, len(sims))
+            top_indices = np.argpartition(-sims, k - 1)[:k]
+            top_indices = top_indices[np.argsort(-sims[top_indices])]
+        return [chunks[i] for i in top_indices], [float(sims[i]) for i in top_indices]
+
+
+def _get_chroma_client():
+    global _chroma_client
+    if _chroma_client is None:
+        import chromadb
+        if CHROMA_HOST:
+            _chroma_client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+        else:
+            _chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+    return _chroma_client
+
+
+class HnswVectorIndex(VectorIndex):
+    """HNSW index (Chroma) per chat, updated incrementally on upload.
+
+    Set CHROMA_HOST when API workers and ingest_worker.py run as separate processes:
+    an embedded Chroma keeps its HNSW segments in process memory, so other processes
+    don't see chunks one process adds.
+    """
+
+    def __init__(self, user_id, chat_id):
+        super().__init__(user_id, chat_id)
+        key = hashlib.sha1(f"{user_id}:{chat_id}".encode("utf-8")).hexdigest()
+        self.collection_name = f"chat_{key}"
+        self._collection = None
+        self._lock = asyncio.Lock()
+        self._synced_at = 0.0
+
+    def _get_collection(self):
+        if self._collection is None:
+            self._collection = _get_chroma_client().get_or_create_collection(
+                name=self.collection_name,
+                metadata={
+                    "hnsw:space": "cosine",
+                    "hnsw:M": HNSW_M,
+                    "hnsw:construction_ef": HNSW_EF_CONSTRUCTION,
+                    "hnsw:search_ef": HNSW_EF_SEARCH,
+                    "user_id": self.user_id,
+                    "chat_id": self.chat_id,
+                }
+            )
+        return self._collection
+
+    async def _ensure_built(self):
+        """Brings the index in line with Mongo when it was never built or its count has drifted.
+
+        Chunks are inserted in Mongo before they are added here, so a failure in between
+        (or an index that predates the chat's chunks) leaves the index short; the missing
+        ids are added. An index with more entries than Mongo is rebuilt.
+        """
+        if self._synced_at and time.monotonic() - self._synced_at < HNSW_SYNC_INTERVAL:
+            return
+        async with self._lock:
+            if self._synced_at and time.monotonic() - self._synced_at < HNSW_SYNC_INTERVAL:
+                return
+            collection = await asyncio.to_thread(self._get_collection)
+            query = {"user_id": self.user_id, "chat_id": self.chat_id}
+            indexed = await asyncio.to_thread(collection.count)
+            stored = await documents_collection.count_documents(query)
+            if indexed > stored:
+                logger.warning(f"{self.collection_name} has {indexed} entries for {stored} chunks, rebuilding")
+                await asyncio.to_thread(_get_chroma_client().delete_collection, self.collection_name)
+                self._collection = None
+                collection = await asyncio.to_thread(self._get_collection)
+                indexed = 0
+            if indexed < stored:
+                added = await self._add_missing(collection, query)
+                if added:
+                    logger.info(f"Backfilled {added} chunks into {self.collection_name}")
+            self._synced_at = time.monotonic()
+
+    async def _add_missing(self, collection, query) -> int:
+        cursor = documents_collection.find(query, {"_id": 1})
+        added = 0
+        while True:
+            batch = await cursor.to_list(length=BACKFILL_BATCH_SIZE)
+            if not batch:
+                break
+            ids = [str(doc["_id"]) for doc in batch]
+            present = set((await asyncio.to_thread(collection.get, ids=ids, include=[]))["ids"])
+            missing = [doc["_id"] for doc, _id in zip(batch, ids) if _id not in present]
+            if not missing:
+                continue
+            docs = await documents_collection.find(
+                {"_id": {"$in": missing}}, {"chunk": 1, **EMBEDDING_FIELDS}
+            ).to_list(length=None)
+            matrix, docs = decode_embeddings([doc for doc in docs if "chunk" in doc])
+            await self._upsert([str(doc["_id"]) for doc in docs], matrix.tolist(), [doc["chunk"] for doc in docs])
+            added += len(docs)
+        return added
+
+    async def _upsert(self, ids, embeddings, documents):
+        if not ids:
+            return
+        collection = await asyncio.to_thread(self._get_collection)
+        await asyncio.to_thread(
+            collection.upsert,
+            ids=ids,
+            embeddings=[list(map(float, e)) for e in embeddings],
+            documents=documents
+        )
+
+    async def add(self, ids, embeddings, documents):
+        # Upsert first so the sync check sees these chunks as present
+        await self._upsert(ids, embeddings, documents)
+        await self._ensure_built()
+
+    async def query(self, embedding, top_k, doc_version=None):
+        await self._ensure_built()
+        collection = await asyncio.to_thread(self._get_collection)
+        count = await asyncio.to_thread(collection.count)
+        if count == 0:
+            return [], []
+        with timer("ann_query"):
+            result = await asyncio.to_thread(
+                collection.query,
+                query_embeddings=[list(map(float, embedding))],
+                n_results=min(top_k, count),
+                include=["documents", "distances"]
+            )
+        documents = result["documents"][0]
+        # Cosine distance is 1 - similarity
+        scores = [1.0 - float(d) for d in result["distances"][0]]
+        return documents, scores
+
+
+_BACKENDS = {
+    "exact": ExactVectorIndex,
+    "hnsw": HnswVectorIndex,
+}
+
+
+def get_vector_index(user_id: str, chat_id: str, backend: str = None) -> VectorIndex:
+    """Returns the cached index for a chat using the configured backend"""
+    backend = backend or VECTOR_INDEX_BACKEND
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown vector index backend: {backend}")
+    key = (backend, user_id, chat_id)
+    index = _indexes.get(key)
+    if index is None:
+        index = _indexes[key] = _BACKENDS[backend](user_id, chat_id)
+    return index
@@ -0,0 +1,45 @@
+"""ONNX Runtime vs torch embedding parity (see bench/embedding_backends.py for the full check).
+
+Skipped unless onnxruntime, sentence-transformers and the model's cached weights are present.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+pytest.importorskip("sentence_transformers")
+huggingface_hub = pytest.importorskip("huggingface_hub")
+
+from bench.embedding_backends import make_corpus
+from rag import embedder, onnx_embedder
+
+MIN_COSINE = 0.98
+
+if huggingface_hub.try_to_load_from_cache(embedder.DEFAULT_MODEL_NAME, "config.json") is None:
+    pytest.skip(f"{embedder.DEFAULT_MODEL_NAME} is not in the local Hugging Face cache",
+                allow_module_level=True)
+
+
+@pytest.fixture(scope="module")
+def texts():
+    return make_corpus(64)
+
+
+@pytest.fixture(scope="module")
+def reference(texts):
+    model = embedder.load_embedding_model(embedder.DEFAULT_MODEL_NAME, "torch")
+    return np.asarray(model.embed_documents(texts), dtype=np.float32)
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_matches_torch(backend, texts, reference, tmp_path, monkeypatch):
+    # Export into a scratch directory rather than the working tree
+    monkeypatch.setattr(onnx_embedder, "ONNX_MODEL_DIR", str(tmp_path))
+    model = embedder.load_embedding_model(embedder.DEFAULT_MODEL_NAME, backend)
+    if not isinstance(model, onnx_embedder.OnnxEmbeddings):
+        pytest.skip(f"{backend} could not be loaded here (torch fallback)")
+
+    vectors = np.asarray(model.embed_documents(texts), dtype=np.float32)
+
+    assert vectors.shape == reference.shape
+    assert np.sum(reference * vectors, axis=1).min() >= MIN_COSINE
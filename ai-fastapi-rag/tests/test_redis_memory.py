@@ -0,0 +1,78 @@
+"""Every stored turn must reach the prompt: in the rolling summary or as a verbatim turn."""
+import asyncio
+import re
+
+from bench.fakes import FakeRedis
+from helper import redis_memory
+from helper.redis_memory import store_memory, get_memory_context, format_memory
+
+CHAT_ID = "chat-1"
+
+
+async def _summarize(summary, turns):
+    # Keeps every question so the test can tell which turns were folded
+    return " ".join(filter(None, [summary] + [turn["question"] for turn in turns]))
+
+
+async def _slow_summarize(summary, turns):
+    await asyncio.sleep(0.05)
+    return await _summarize(summary, turns)
+
+
+async def _drain_folds():
+    while redis_memory._fold_tasks:
+        await asyncio.gather(*list(redis_memory._fold_tasks))
+
+
+async def _missing(redis, questions):
+    memory = await get_memory_context(redis, CHAT_ID)
+    prompt = format_memory(memory)
+    return [question for question in questions if not re.search(rf"\b{question}\b", prompt)]
+
+
+def test_sequential_turns_all_reach_the_prompt():
+    async def run():
+        redis = FakeRedis()
+        questions = [f"q{i}" for i in range(25)]
+        for i, question in enumerate(questions):
+            await store_memory(redis, CHAT_ID, question, f"a{i}", _summarize)
+            await _drain_folds()
+            assert await _missing(redis, questions[:i + 1]) == []
+        memory = await get_memory_context(redis, CHAT_ID)
+        assert memory["summary"]
+        assert len(memory["turns"]) < redis_memory.MEMORY_WINDOW + redis_memory.MEMORY_FOLD_BATCH
+    asyncio.run(run())
+
+
+def test_turns_reach_the_prompt_while_a_fold_is_running():
+    async def run():
+        redis = FakeRedis()
+        questions = [f"q{i}" for i in range(25)]
+        for i, question in enumerate(questions):
+            await store_memory(redis, CHAT_ID, question, f"a{i}", _slow_summarize)
+            assert await _missing(redis, questions[:i + 1]) == []
+        await _drain_folds()
+        assert await _missing(redis, questions) == []
+    asyncio.run(run())
+
+
+def test_concurrent_writers_lose_no_turns():
+    async def run():
+        redis = FakeRedis()
+        questions = [f"q{i}" for i in range(40)]
+        await asyncio.gather(*(store_memory(redis, CHAT_ID, question, "a", _slow_summarize)
+                               for question in questions))
+        await _drain_folds()
+        assert await _missing(redis, questions) == []
+    asyncio.run(run())
+
+
+def test_turns_kept_without_a_summarizer():
+    async def run():
+        redis = FakeRedis()
+        questions = [f"q{i}" for i in range(15)]
+        for question in questions:
+            await store_memory(redis, CHAT_ID, question, "a")
+        await _drain_folds()
+        assert await _missing(redis, questions) == []
+    asyncio.run(run())
@@ -0,0 +1,36 @@
+import asyncio
+import time
+
+from helper.streaming import coalesce
+
+
+async def _pieces(delays):
+    for i, delay in enumerate(delays):
+        await asyncio.sleep(delay)
+        yield f"t{i} "
+
+
+async def _frames(source, **kwargs):
+    start = time.perf_counter()
+    return [(round(time.perf_counter() - start, 2), frame) async for frame in coalesce(source, **kwargs)]
+
+
+def test_buffered_text_is_flushed_while_the_source_stalls():
+    # t1 arrives right after t0 (buffered), then the source goes quiet for 0.5s
+    frames = asyncio.run(_frames(_pieces([0, 0.01, 0.5]), interval=0.05, max_chars=1000))
+
+    assert [frame for _, frame in frames] == ["t0 ", "t1 ", "t2 "]
+    # t1 went out on the timer, not when t2 arrived
+    assert frames[1][0] < 0.3
+
+
+def test_pieces_within_the_interval_are_joined():
+    frames = asyncio.run(_frames(_pieces([0, 0, 0, 0]), interval=10, max_chars=1000))
+
+    assert [frame for _, frame in frames] == ["t0 ", "t1 t2 t3 "]
+
+
+def test_max_chars_flushes_early():
+    frames = asyncio.run(_frames(_pieces([0] * 5), interval=10, max_chars=6))
+
+    assert [frame for _, frame in frames] == ["t0 ", "t1 t2 ", "t3 t4 "]
@@ -3,6 +3,38 @@ const axios = require('axios');
 const fs = require('fs');
 const FormData = require('form-data');
 
+const FASTAPI_URL = 'http://localhost:8000';
+// /process queues the file (202 + job_id); poll the job until ingestion finishes
+const PROCESS_POLL_INTERVAL_MS = 1000;
+const PROCESS_TIMEOUT_MS = parseInt(process.env.PROCESS_TIMEOUT_MS || '300000', 10);
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+async function waitForJob(jobId, token) {
+  const deadline = Date.now() + PROCESS_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    const { data: job } = await axios.get(`${FASTAPI_URL}/process/${jobId}`, {
+      headers: { 'Authorization': `Bearer ${token}`, 'Accept': 'application/json' },
+      timeout: 10000
+    });
+    if (job.status === 'done') {
+      // Same shape the synchronous /process used to return
+      return {
+        status: 'success',
+        message: 'File processed and embedded successfully',
+        filename: job.filename,
+        summary: job.summary,
+        job_id: jobId
+      };
+    }
+    if (job.status === 'failed') {
+      throw new Error(`Processing failed: ${job.error}`);
+    }
+    await sleep(PROCESS_POLL_INTERVAL_MS);
+  }
+  throw new Error(`Processing job ${jobId} did not finish in time`);
+}
+
 async function forwardToFastAPI(filePath, token, chat_id) {
   const form = new FormData();
   form.append('file', fs.createReadStream(filePath));
@@ -11,7 +43,7 @@ async function forwardToFastAPI(filePath, token, chat_id) {
   console.log("Forwarding to FastAPI with token:", token); // Debug log
 
   try {
-    const response = await axios.post('http://localhost:8000/process', form, {
+    const response = await axios.post(`${FASTAPI_URL}/process`, form, {
       headers: {
         ...form.getHeaders(),
         'Authorization': `Bearer ${token}`,
@@ -19,16 +51,19 @@ async function forwardToFastAPI(filePath, token, chat_id) {
       },
       timeout: 30000
     });
+    if (response.status === 202 && response.data.job_id) {
+      return await waitForJob(response.data.job_id, token);
+    }
     return response.data;
   } catch (error) {
     console.error('Forwarding error:', {
       status: error.response?.status,
       data: error.response?.data,
-      headers: error.response?.headers
+      headers: error.response?.headers,
+      message: error.message
     });
     throw error;
   }
 }
 
 module.exports = forwardToFastAPI;
-
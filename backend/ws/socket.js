@@ -22,32 +22,54 @@ function setupWebSocket(wss) {
           Authorization: `Bearer ${token}`
         };
 
+        // Abort the FastAPI request if the browser leaves, so it stops generating
+        const controller = new AbortController();
+        ws.once('close', () => controller.abort());
+
         console.log('🚀 Sending to FastAPI:', { question });
         const res = await axios.post('http://127.0.0.1:8000/ask', form, {
           headers,
-          responseType: 'stream'
+          responseType: 'stream',
+          signal: controller.signal
         });
 
+        // /ask streams server-sent events; a TCP chunk may hold several events or part of one
+        let buffer = '';
         res.data.on('data', (chunk) => {
-          try {
-            const data = JSON.parse(chunk.toString());
-            console.log('📥 Received chunk:', data); // Debug each chunk
-            
-            if (data.content) {
-              fullAnswer += data.content;
-              ws.send(JSON.stringify({
-                type: 'partial',
-                chunk: data.content,
-                debug: `Chunk ${Date.now()}` // For debugging
-              }));
+          buffer += chunk.toString();
+          let boundary;
+          while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            const dataLines = rawEvent
+              .split('\n')
+              .filter((line) => line.startsWith('data:'))
+              .map((line) => line.slice(5).trimStart());
+            if (!dataLines.length) continue;
+
+            try {
+              const data = JSON.parse(dataLines.join('\n'));
+              console.log('📥 Received chunk:', data); // Debug each chunk
+
+              if (data.type === 'error') {
+                ws.send(JSON.stringify({ type: 'error', message: data.content }));
+              } else if (data.content) {
+                fullAnswer += data.content;
+                ws.send(JSON.stringify({
+                  type: 'partial',
+                  chunk: data.content,
+                  debug: `Chunk ${Date.now()}` // For debugging
+                }));
+              }
+            } catch (e) {
+              console.error('❌ Chunk parse error:', e);
             }
-          } catch (e) {
-            console.error('❌ Chunk parse error:', e);
           }
         });
 
         res.data.on('end', () => {
           console.log('🏁 Stream complete. Full answer:', fullAnswer);
+          if (ws.readyState !== ws.OPEN) return;
           ws.send(JSON.stringify({
             type: 'complete',
             question: question,
@@ -58,6 +80,7 @@ function setupWebSocket(wss) {
 
         res.data.on('error', (err) => {
           console.error('🔴 Stream error:', err);
+          if (ws.readyState !== ws.OPEN) return;
           ws.send(JSON.stringify({
             type: 'error',
             message: 'Stream error'